@@ -1,5 +1,5 @@
 import numpy as np
-from collections import Counter
+from collections import Counter, defaultdict
 from typing import List, Dict, Iterable
 from math import log
 
@@ -21,10 +21,12 @@ def jaccard_scores(target_items: Iterable[str], cooc: Dict[str, Counter]) -> Dic
             scores[cand] += w
     return dict(scores)
 
-def build_cooccurrence(train_sets: List[set]) -> Dict[str, Counter]:
-    # co-occur counts for item–item (symmetric)
+def build_cooccurrence(train_sets: List[set], weights: List[float] | None = None) -> Dict[str, Counter]:
+    # co-occur counts for item–item (symmetric); weights down-weight rows (e.g. near-duplicates)
     cooc: Dict[str, Counter] = {}
-    for s in train_sets:
+    if weights is None:
+        weights = [1] * len(train_sets)
+    for s, w in zip(train_sets, weights):
         items = list(s)
         for i in range(len(items)):
             a = items[i]
@@ -32,8 +34,8 @@ def build_cooccurrence(train_sets: List[set]) -> Dict[str, Counter]:
             for j in range(i+1, len(items)):
                 b = items[j]
                 cooc.setdefault(b, Counter())
-                cooc[a][b] += 1
-                cooc[b][a] += 1
+                cooc[a][b] += w
+                cooc[b][a] += w
     return cooc
 
 def build_item_stats(train_sets: List[set]):
@@ -86,3 +88,63 @@ def recommend_itemknn(known: set, cooc: Dict[str, Counter], k=5) -> List[str]:
     out = [it for it, _ in ranked if it not in known][:k]
     return out
 
+
+def build_class_slices(train_sets: List[set], classes: List[str | None], subclasses: List[str | None] | None = None, min_rows=3):
+    """
+    Class-conditioned statistics: per primary_class (and primary_class::subclass)
+    normalized popularity vector + co-occurrence slice. Slices with fewer than
+    min_rows training sets are dropped so lookups fall back to the coarser level.
+    """
+    if subclasses is None:
+        subclasses = [None] * len(train_sets)
+    groups: Dict[str, List[set]] = defaultdict(list)
+    for s, c, sc in zip(train_sets, classes, subclasses):
+        if not c:
+            continue
+        groups[c].append(s)
+        if sc:
+            groups[f"{c}::{sc}"].append(s)
+    slices = {}
+    for key, ss in groups.items():
+        if len(ss) < min_rows:
+            continue
+        cnt = Counter()
+        for s in ss:
+            cnt.update(s)
+        slices[key] = {
+            "n": len(ss),
+            "count": dict(cnt),
+            "maxc": max(cnt.values()) if cnt else 1,
+            "cooc": build_cooccurrence(ss),
+        }
+    return slices
+
+def class_slice_scores(slices: dict, primary: str | None, subclass: str | None, known: set, own: set | None = None) -> Dict[str, float]:
+    """
+    Look up the query's slice (subclass first, then class) and score only its items.
+    own: the querying row's training set; its counts are subtracted so a row
+    never votes for itself (keeps leave-one-out honest).
+    """
+    sl = slices.get(f"{primary}::{subclass}") or slices.get(primary)
+    if sl is None:
+        return {}
+    own = own or set()
+    maxc = sl["maxc"]
+    scores = {}
+    for t, c in sl["count"].items():
+        if t in known:
+            continue
+        c -= t in own
+        if c > 0:
+            scores[t] = c / maxc
+    co = jaccard_scores(known, sl["cooc"])
+    n_own_known = len(known & own)
+    for t in own:
+        if t in co:
+            co[t] -= n_own_known
+    maxco = max(co.values()) if co else 0
+    if maxco > 0:
+        for t, v in co.items():
+            if v > 0:
+                scores[t] = scores.get(t, 0.0) + v / maxco
+    return scores
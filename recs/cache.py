@@ -0,0 +1,63 @@
+import hashlib
+import json
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, Tuple
+
+from . import metrics
+
+CACHE_HITS   = metrics.counter("recs_cache_hits_total", "Result-cache entries reused")
+CACHE_MISSES = metrics.counter("recs_cache_misses_total", "Result-cache lookups that needed recomputation")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    kind          TEXT NOT NULL,
+    row_id        INTEGER NOT NULL,
+    input_key     TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    payload       TEXT NOT NULL,
+    PRIMARY KEY (kind, row_id)
+)
+"""
+
+def _default(o):
+    # numpy scalars/arrays, sets, paths...
+    if hasattr(o, "tolist"):
+        return o.tolist()
+    if isinstance(o, (set, frozenset)):
+        return sorted(o)
+    return str(o)
+
+def fingerprint(*parts) -> str:
+    """Stable hash of JSON-able inputs (sets are sorted, numpy values converted)."""
+    blob = json.dumps(parts, sort_keys=True, default=_default, separators=(",", ":"))
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+def file_fingerprint(*paths: str | Path) -> str:
+    h = hashlib.sha1()
+    for p in paths:
+        p = Path(p)
+        if p.exists():
+            h.update(p.read_bytes())
+    return h.hexdigest()
+
+def open_cache(path: str | Path) -> sqlite3.Connection:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path))
+    conn.execute(SCHEMA)
+    return conn
+
+def cache_lookup(conn: sqlite3.Connection, kind: str, keys: Dict[int, str], model_version: str) -> Dict[int, dict]:
+    """keys: row_id -> input fingerprint. Returns payloads for rows whose key and model version still match."""
+    cur = conn.execute("SELECT row_id, input_key, payload FROM results WHERE kind = ? AND model_version = ?",
+                       (kind, model_version))
+    hits = {rid: json.loads(payload) for rid, key, payload in cur if keys.get(rid) == key}
+    CACHE_HITS.inc(len(hits), kind=kind)
+    CACHE_MISSES.inc(len(keys) - len(hits), kind=kind)
+    return hits
+
+def cache_store(conn: sqlite3.Connection, kind: str, model_version: str, entries: Iterable[Tuple[int, str, dict]]) -> None:
+    """entries: (row_id, input_key, payload); replaces any previous entry for the row."""
+    rows = [(kind, int(rid), key, model_version, json.dumps(payload, default=_default)) for rid, key, payload in entries]
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)", rows)
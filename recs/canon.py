@@ -0,0 +1,104 @@
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+from .dataio import write_parquet
+
+# words that don't distinguish items ("studded_leather_armor" == "studded_leather")
+NOISE_WORDS = {"armor", "armour", "of", "the", "a"}
+
+_BONUS_RE = re.compile(r"^(?:\+?\d+|plus\d*)$")  # enchantment / numbering words: '1', '+2', 'plus', 'plus1'
+
+def _words(token: str) -> List[str]:
+    return [p for p in str(token).lower().replace("+", "_+").split("_") if p and p not in NOISE_WORDS]
+
+def canon_key(token: str) -> str:
+    """
+    Separator/case-insensitive key: 'long_sword', 'Longsword' -> 'longsword'. Word order is kept
+    ('crossbow_light' != 'light_crossbow') and so is the bonus: 'longsword_1', '+1_longsword' -> 'longsword1'.
+    """
+    words = _words(token)
+    bonus = sorted(re.sub(r"\D", "", p) for p in words if _BONUS_RE.match(p))
+    key = "".join(p for p in words if not _BONUS_RE.match(p)) + "".join(bonus)
+    return key or str(token).lower()
+
+def base_key(token: str) -> str:
+    """canon_key without the bonus: the item a variant is an instance of ('+1_longsword' -> 'longsword')."""
+    key = "".join(p for p in _words(token) if not _BONUS_RE.match(p))
+    return key or canon_key(token)
+
+def build_canon_index(counts: Dict[str, int], threshold=90.0, block_len=4) -> Dict[str, str]:
+    """
+    Map every token to a canonical token (the most frequent variant of its group).
+    1) exact grouping on canon_key; 2) fuzzy merge of keys with rapidfuzz, compared only
+    inside blocks sharing the first block_len characters and the same digits (so
+    'longsword1' never merges into 'longsword'), so cost stays near-linear.
+    """
+    by_key: Dict[str, List[str]] = defaultdict(list)
+    for tok in counts:
+        by_key[canon_key(tok)].append(tok)
+
+    keys = list(by_key)
+    parent = {k: k for k in keys}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    blocks: Dict[str, List[str]] = defaultdict(list)
+    for k in keys:
+        blocks[(k[:block_len], re.sub(r"\D", "", k))].append(k)
+    for members in blocks.values():
+        if len(members) < 2:
+            continue
+        sims = process.cdist(members, members, scorer=fuzz.ratio, score_cutoff=threshold)
+        for i, j in zip(*sims.nonzero()):
+            if i < j:
+                ra, rb = find(members[i]), find(members[j])
+                if ra != rb:
+                    parent[max(ra, rb)] = min(ra, rb)
+
+    groups: Dict[str, List[str]] = defaultdict(list)
+    for k in keys:
+        groups[find(k)].extend(by_key[k])
+    mapping = {}
+    for toks in groups.values():
+        canonical = max(toks, key=lambda t: (counts[t], -len(t), t))
+        for t in toks:
+            mapping[t] = canonical
+    return mapping
+
+def build_field_canon(series_of_lists: pd.Series, threshold=90.0, extra: Iterable[str] = ()) -> Dict[str, str]:
+    """extra: tokens to map as well without counting them (e.g. legality rule items), so they land on the canonical id."""
+    counts = Counter(t for lst in series_of_lists for t in (list(lst) if lst is not None else []))
+    for t in extra:
+        counts.setdefault(t, 0)
+    return build_canon_index(counts, threshold=threshold)
+
+def canonicalize_list(tokens: Iterable[str], mapping: Dict[str, str]) -> List[str]:
+    out, seen = [], set()
+    for t in tokens:
+        c = mapping.get(t, t)
+        if c not in seen:
+            seen.add(c)
+            out.append(c)
+    return out
+
+def canon_table(mappings: Dict[str, Dict[str, str]]) -> pd.DataFrame:
+    rows = [{"field": f, "token": t, "canonical": c} for f, m in mappings.items() for t, c in m.items()]
+    return pd.DataFrame(rows, columns=["field", "token", "canonical"])
+
+def save_canon(path: str | Path, mappings: Dict[str, Dict[str, str]]) -> None:
+    write_parquet(canon_table(mappings), path)
+
+def load_canon(path: str | Path) -> Dict[str, Dict[str, str]]:
+    df = pd.read_parquet(path)
+    out: Dict[str, Dict[str, str]] = defaultdict(dict)
+    for f, t, c in df[["field", "token", "canonical"]].itertuples(index=False):
+        out[f][t] = c
+    return dict(out)
@@ -33,6 +33,17 @@ def _coerce_int(x):
     except Exception:
         return None
 
+def ability_columns(columns) -> list:
+    """Columns extract_ability_scores would read (for projected reads of the original snapshot)."""
+    out = []
+    for col in columns:
+        lc = str(col).lower()
+        if lc in ("abilityscores", "ability_scores") or any(
+            lc.endswith(f"_{key}") or lc == key or ("ability" in lc and key in lc) for key in ABILITY_ALIASES
+        ):
+            out.append(col)
+    return out
+
 def extract_ability_scores(row) -> Dict[str, int]:
     """
     Try common shapes:
@@ -85,3 +96,19 @@ def check_requirement(klass: str, scores: Dict[str,int]) -> Tuple[bool, str]:
     if missing:
         return False, " & ".join(missing)
     return True, "ok"
+
+def check_minima(rules: Dict[str, int], scores: Dict[str, int]) -> Tuple[bool, str]:
+    """
+    Generic ability minima, e.g. {"dex": 13} or {"int_or_wis": 13}.
+    Keys joined with '_or_' need any one of the abilities. Returns (ok, reason).
+    """
+    missing = []
+    for key, need in rules.items():
+        abbrs = key.split("_or_")
+        if any((scores.get(a) or 0) >= need for a in abbrs):
+            continue
+        have = ", ".join(f"{a.upper()}={scores.get(a) or 0}" for a in abbrs)
+        missing.append(" or ".join(f"{a.upper()}>={need}" for a in abbrs) + f" (have {have})")
+    if missing:
+        return False, " & ".join(missing)
+    return True, "ok"
@@ -1,5 +1,11 @@
 from pathlib import Path
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# low-cardinality columns read as categoricals (Arrow dictionary-encoded)
+CATEGORY_COLUMNS = {"primary_class", "primary_subclass", "class", "subclass"}
 
 def read_characters_xlsx(path: str | Path) -> pd.DataFrame:
     path = Path(path)
@@ -19,3 +25,25 @@ def read_characters_xlsx(path: str | Path) -> pd.DataFrame:
 def write_parquet(df: pd.DataFrame, path: str | Path) -> None:
     Path(path).parent.mkdir(parents=True, exist_ok=True)
     df.to_parquet(path, index=False)
+
+def _arrow_strings(dtype: pa.DataType):
+    if pa.types.is_string(dtype) or pa.types.is_large_string(dtype):
+        return pd.StringDtype("pyarrow")
+    return None
+
+def parquet_columns(path: str | Path) -> list[str]:
+    return pq.read_schema(path).names
+
+def read_parquet(path: str | Path, columns: list[str] | None = None, categories=CATEGORY_COLUMNS) -> pd.DataFrame:
+    """
+    Projected parquet read: only `columns` are decoded, class-like columns come
+    back as categoricals and the remaining strings stay Arrow-backed.
+    """
+    if columns is not None:
+        available = set(parquet_columns(path))
+        columns = [c for c in columns if c in available]
+    table = pq.read_table(path, columns=columns)
+    for i, name in enumerate(table.column_names):
+        if name in categories and pa.types.is_string(table.schema.field(i).type):
+            table = table.set_column(i, name, pc.dictionary_encode(table.column(i)))
+    return table.to_pandas(types_mapper=_arrow_strings)
@@ -0,0 +1,98 @@
+import re
+import zlib
+from collections import defaultdict
+from typing import List, Dict, Iterable
+import numpy as np
+import pandas as pd
+
+from .vocab import lists_to_sets
+
+MECH_FIELDS = ["feats", "weapons", "armor"]
+_PRIME = (1 << 31) - 1
+_WORD_RE = re.compile(r"\w+")
+
+def text_shingles(text: str, k=3) -> set:
+    """Word k-shingles of a narrative blob."""
+    words = _WORD_RE.findall(text.lower()) if isinstance(text, str) else []
+    if len(words) < k:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+def character_shingles(mech: pd.DataFrame, narr: pd.DataFrame | None = None, fields=MECH_FIELDS, k=3) -> List[set]:
+    """Mechanical items (field-prefixed) + narrative shingles per row."""
+    out = [set() for _ in range(len(mech))]
+    for f in fields:
+        for i, s in enumerate(lists_to_sets(mech[f])):
+            out[i].update(f"{f}:{t}" for t in s)
+    if narr is not None:
+        for i, text in enumerate(narr["narrative_text"].tolist()):
+            out[i].update(text_shingles(text, k))
+    return out
+
+def minhash_signatures(shingle_sets: List[set], num_perm=64, seed=42) -> np.ndarray:
+    """(N x num_perm) MinHash signatures with universal hashes (a*x + b) mod p."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+    sig = np.full((len(shingle_sets), num_perm), _PRIME, dtype=np.uint64)
+    for i, sh in enumerate(shingle_sets):
+        if not sh:
+            continue
+        x = np.fromiter((zlib.crc32(s.encode("utf-8")) & _PRIME for s in sh), dtype=np.uint64, count=len(sh))
+        sig[i] = ((x[:, None] * a[None, :] + b[None, :]) % _PRIME).min(axis=0)
+    return sig
+
+def lsh_clusters(sig: np.ndarray, bands=16, threshold=0.8) -> np.ndarray:
+    """
+    Banded LSH over signatures: rows sharing a band bucket become candidate pairs,
+    kept when their estimated Jaccard >= threshold, then merged with union-find.
+    Returns a cluster id per row (the smallest row index in its cluster).
+    """
+    n, num_perm = sig.shape
+    r = max(1, num_perm // bands)
+    parent = list(range(n))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    empty = (sig == _PRIME).all(axis=1)
+    for b in range(bands):
+        buckets: Dict[bytes, List[int]] = defaultdict(list)
+        band = sig[:, b * r:(b + 1) * r]
+        for i in range(n):
+            if not empty[i]:
+                buckets[band[i].tobytes()].append(i)
+        for members in buckets.values():
+            # compare each member against one representative per component seen in this bucket;
+            # members already merged into one of those components are skipped
+            reps: List[int] = []
+            for i in members:
+                if any(find(j) == find(i) for j in reps):
+                    continue
+                merged = False
+                for j in reps:
+                    ra, rb = find(i), find(j)
+                    if ra != rb and float((sig[i] == sig[j]).mean()) >= threshold:
+                        parent[max(ra, rb)] = min(ra, rb)
+                        merged = True
+                if not merged:
+                    reps.append(i)
+    return np.array([find(i) for i in range(n)], dtype=np.int64)
+
+def duplicate_clusters(mech: pd.DataFrame, narr: pd.DataFrame | None = None, threshold=0.8, num_perm=64, bands=16) -> np.ndarray:
+    sig = minhash_signatures(character_shingles(mech, narr), num_perm=num_perm)
+    return lsh_clusters(sig, bands=bands, threshold=threshold)
+
+def dedup_weights(cluster_ids: Iterable[int]) -> np.ndarray:
+    """Down-weighting: each row counts 1 / (size of its cluster)."""
+    ids = np.asarray(cluster_ids)
+    _, inv, counts = np.unique(ids, return_inverse=True, return_counts=True)
+    return 1.0 / counts[inv]
+
+def representatives(cluster_ids: Iterable[int]) -> List[int]:
+    """Collapsing: the first row of every cluster."""
+    ids = np.asarray(cluster_ids)
+    return sorted(np.unique(ids, return_index=True)[1].tolist())
@@ -1,5 +1,6 @@
 from typing import List, Dict, Tuple
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import random
 
@@ -40,14 +41,18 @@ def loo_eval_per_field(
 def loo_eval_rowwise(
     all_sets: List[set],
     recommender_for_row,  # fn(row_id:int, known:set, k:int) -> List[str]
-    k=5
+    k=5,
+    row_ids: List[int] | None = None,  # restrict to a subset of rows (e.g. tuning rungs)
+    rng: random.Random | None = None,  # held-out target sampling (None = global random state)
 ) -> Tuple[float, float, int]:
     r_list, m_list = [], []
     n = 0
-    for rid, s in enumerate(all_sets):
+    rows = range(len(all_sets)) if row_ids is None else row_ids
+    for rid in rows:
+        s = all_sets[rid]
         if len(s) < 1:
             continue
-        target = random.choice(list(s))
+        target = (rng or random).choice(list(s))
         known = set(s) - {target}
         recs = recommender_for_row(rid, known, k)
         r_list.append(recall_at_k(target, recs, k))
@@ -56,3 +61,112 @@ def loo_eval_rowwise(
     recall = float(np.mean(r_list)) if r_list else 0.0
     mrr    = float(np.mean(m_list)) if m_list else 0.0
     return recall, mrr, n
+
+# ---------------------------------------------------------------------------
+# K-fold / full-rank evaluation with vectorized metrics
+
+def kfold_splits(n_rows: int, n_folds=5, seed=42, groups=None) -> List[Tuple[List[int], List[int]]]:
+    """
+    Shuffled k-fold split of row ids -> [(train_ids, test_ids), ...].
+    groups: cluster id per row (e.g. near-duplicates); a group never straddles folds.
+    """
+    if groups is None:
+        idxs = np.random.default_rng(seed).permutation(n_rows)
+        folds = np.array_split(idxs, n_folds)
+    else:
+        groups = np.asarray(groups)
+        uniq = np.random.default_rng(seed).permutation(np.unique(groups))
+        folds = [np.flatnonzero(np.isin(groups, g)) for g in np.array_split(uniq, n_folds)]
+    out = []
+    for i, test in enumerate(folds):
+        train = np.concatenate([f for j, f in enumerate(folds) if j != i]) if n_folds > 1 else test
+        out.append((train.tolist(), test.tolist()))
+    return out
+
+def build_queries(all_sets: List[set], row_ids: List[int], protocol="all_but_one", seed=42):
+    """
+    protocol="all_but_one": every item of every row is held out once (known = rest).
+    protocol="random":      one random held-out item per row (as loo_eval_*).
+    Returns list of (row_id, known_set, target).
+    """
+    rng = random.Random(seed)
+    out = []
+    for rid in row_ids:
+        s = all_sets[rid]
+        if len(s) < 1:
+            continue
+        items = sorted(s)
+        targets = items if protocol == "all_but_one" else [rng.choice(items)]
+        for t in targets:
+            out.append((rid, set(s) - {t}, t))
+    return out
+
+def rank_metrics(recs: np.ndarray, targets: np.ndarray, ks=(1, 5, 10), catalog_size: int | None = None) -> Dict[str, float]:
+    """
+    recs: (Q, K) int matrix of recommended item ids, -1 padded.
+    targets: (Q,) int item ids of the held-out items.
+    Returns recall/mrr/ndcg/coverage at each k, computed in one pass over the matrix.
+    """
+    out: Dict[str, float] = {"n": int(len(targets))}
+    if len(targets) == 0:
+        for k in ks:
+            out.update({f"recall@{k}": 0.0, f"mrr@{k}": 0.0, f"ndcg@{k}": 0.0, f"coverage@{k}": 0.0})
+        return out
+    hits = recs == targets[:, None]
+    pos = np.arange(1, recs.shape[1] + 1, dtype=float)
+    rr = hits / pos
+    dg = hits / np.log2(pos + 1.0)
+    for k in ks:
+        out[f"recall@{k}"] = float(hits[:, :k].any(axis=1).mean())
+        out[f"mrr@{k}"] = float(rr[:, :k].max(axis=1).mean())
+        out[f"ndcg@{k}"] = float(dg[:, :k].sum(axis=1).mean())  # single relevant item -> IDCG = 1
+        if catalog_size:
+            top = recs[:, :k]
+            out[f"coverage@{k}"] = float(len(np.unique(top[top >= 0])) / catalog_size)
+    return out
+
+def _run_fold(build_model, all_sets, train_ids, queries, max_k, rowwise):
+    rec = build_model([all_sets[i] for i in train_ids])
+    if rowwise:
+        return [list(rec(rid, known, max_k)) for rid, known, _ in queries]
+    return [list(rec(known, max_k)) for _, known, _ in queries]
+
+def kfold_eval(
+    all_sets: List[set],
+    build_model,  # fn(train_sets) -> recommender_fn(known, k) (or (row_id, known, k) if rowwise)
+    ks=(1, 5, 10),
+    n_folds=5,
+    protocol="all_but_one",
+    rowwise=False,
+    n_jobs: int | None = None,
+    seed=42,
+    groups=None,
+) -> Dict[str, float]:
+    """
+    K-fold evaluation: fold models are built (and queried) in a process pool,
+    their rankings are stacked into a single rank matrix and scored with rank_metrics.
+    build_model must be picklable (a module-level function) when n_jobs != 1.
+    """
+    max_k = max(ks)
+    splits = kfold_splits(len(all_sets), n_folds=n_folds, seed=seed, groups=groups)
+    fold_queries = [build_queries(all_sets, test, protocol=protocol, seed=seed) for _, test in splits]
+    if n_jobs == 1:
+        results = [_run_fold(build_model, all_sets, tr, q, max_k, rowwise)
+                   for (tr, _), q in zip(splits, fold_queries)]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as ex:
+            futs = [ex.submit(_run_fold, build_model, all_sets, tr, q, max_k, rowwise)
+                    for (tr, _), q in zip(splits, fold_queries)]
+            results = [f.result() for f in futs]
+
+    vocab: Dict[str, int] = {}
+    for s in all_sets:
+        for t in s:
+            vocab.setdefault(t, len(vocab))
+    recs_all = [r for res in results for r in res]
+    targets = np.array([vocab[t] for q in fold_queries for _, _, t in q], dtype=np.int64)
+    mat = np.full((len(recs_all), max_k), -1, dtype=np.int64)
+    for i, r in enumerate(recs_all):
+        ids = [vocab.get(x, -1) for x in r[:max_k]]
+        mat[i, :len(ids)] = ids
+    return rank_metrics(mat, targets, ks=ks, catalog_size=len(vocab))
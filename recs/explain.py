@@ -0,0 +1,113 @@
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, List
+import numpy as np
+
+from .class_eligibility import check_requirement
+
+ITEM_PARTS = ["from_itemknn", "from_narrative", "from_pop", "from_class"]
+NEXT_CLASS_PARTS = ["from_cooc", "from_narrative", "from_pop"]
+
+# next-class eligibility reason codes (text is rendered on demand)
+REASON_OK, REASON_NO_REQUIREMENT, REASON_INELIGIBLE = 0, 1, 2
+
+def reason_code(ok: bool, reason: str) -> int:
+    if not ok:
+        return REASON_INELIGIBLE
+    return REASON_NO_REQUIREMENT if reason == "no_requirement" else REASON_OK
+
+def item_record(items: List[str], scores, parts, penalty, primary_class, components=None) -> dict:
+    """
+    Compact top-k explanation for an item field: ids + (k x parts) contribution matrix.
+    components: scorer components that ran for this request ("name~" = approximated).
+    """
+    return {
+        "kind": "item",
+        "items": list(items),
+        "scores": np.asarray(scores, dtype=float),
+        "parts": np.asarray(parts, dtype=float).reshape(len(items), len(ITEM_PARTS)),
+        "penalty": np.asarray(penalty, dtype=float),
+        "primary_class": primary_class,
+        "components": tuple(components) if components is not None else None,
+    }
+
+def next_class_record(items: List[str], scores, parts, codes, primary_class, owned, abilities) -> dict:
+    return {
+        "kind": "next_class",
+        "items": list(items),
+        "scores": np.asarray(scores, dtype=float),
+        "parts": np.asarray(parts, dtype=float).reshape(len(items), len(NEXT_CLASS_PARTS)),
+        "codes": np.asarray(codes, dtype=np.int8),
+        "primary_class": primary_class,
+        "owned": tuple(sorted(owned)),
+        "abilities": abilities,
+    }
+
+def render(rec: dict, row_id: int) -> List[Dict]:
+    """Human-readable explanation rows for one compact record."""
+    out = []
+    if rec["kind"] == "item":
+        for i, item in enumerate(rec["items"]):
+            d = {"item": item, "score": float(rec["scores"][i])}
+            d.update({name: float(v) for name, v in zip(ITEM_PARTS, rec["parts"][i])})
+            d["penalty"] = float(rec["penalty"][i])
+            d["primary_class"] = rec["primary_class"]
+            if rec.get("components") is not None:
+                d["components"] = "|".join(rec["components"])
+            out.append(d)
+    elif rec["kind"] == "next_class":
+        owned = "|".join(rec["owned"]) if rec["owned"] else ""
+        for i, cand in enumerate(rec["items"]):
+            code = int(rec["codes"][i])
+            d = {
+                "row_id": row_id,
+                "candidate_class": cand,
+                "score_pre_sort": float(rec["scores"][i]),
+                "eligibility": "ineligible" if code == REASON_INELIGIBLE else "eligible",
+                "eligibility_reason": check_requirement(cand, rec["abilities"])[1],
+                "primary_class": rec["primary_class"],
+                "owned_classes": owned,
+            }
+            d.update({name: float(v) for name, v in zip(NEXT_CLASS_PARTS, rec["parts"][i])})
+            out.append(d)
+    return out
+
+def render_batch(records) -> List[Dict]:
+    """Synchronous batch step: records is an iterable of (row_id, field, record)."""
+    rows = []
+    for rid, field, rec in records:
+        for d in render(rec, rid):
+            d.update({"row_id": rid, "field": field})
+            rows.append(d)
+    return rows
+
+class ExplanationWriter:
+    """
+    Renders compact records on a background thread pool so scoring never waits
+    on string formatting; results are collected in submission order.
+    """
+    def __init__(self, max_workers=2):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._futures: List[Future] = []
+
+    def submit(self, rid: int, rec: dict, **extra) -> Future:
+        """Queue rendering of one record; extra columns (e.g. row_id, field) are added to each row."""
+        def job():
+            rows = render(rec, rid)
+            for d in rows:
+                d.update(extra)
+            return rows
+        fut = self._pool.submit(job)
+        self._futures.append(fut)
+        return fut
+
+    def rows(self) -> List[Dict]:
+        return [d for f in self._futures for d in f.result()]
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
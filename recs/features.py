@@ -21,12 +21,11 @@ def normalize(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
     armor_col   = next((c for c in df.columns if c in ["armor","armour","armor_list","armour_list"]), None)
 
     # Parse classes into exploded rows
-    parsed = df[[class_col]].copy()
-    parsed["__parsed"] = parsed[class_col].apply(parse_classes_field)
+    parsed = df[class_col].apply(parse_classes_field)
 
     class_rows: List[Dict] = []
-    for idx, row in parsed.iterrows():
-        for item in row["__parsed"]:
+    for idx, items in parsed.items():
+        for item in items:
             class_rows.append({
                 "row_id": idx,
                 "class": item["class"],
@@ -44,31 +43,26 @@ def normalize(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
     else:
         prim = pd.DataFrame(columns=["row_id","primary_class","primary_subclass","primary_level"])
 
-    # Build a “mechanical” table (multi-hot-ish lists preserved)
-    mech = df.copy()
-    mech["row_id"] = mech.index
-
-    if feats_col:   mech["feats"]   = mech[feats_col].apply(split_listish)
-    else:           mech["feats"]   = [[] for _ in range(len(mech))]
-    if weapons_col: mech["weapons"] = mech[weapons_col].apply(split_listish)
-    else:           mech["weapons"] = [[] for _ in range(len(mech))]
-    if armor_col:   mech["armor"]   = mech[armor_col].apply(split_listish)
-    else:           mech["armor"]   = [[] for _ in range(len(mech))]
+    # Build a “mechanical” table (multi-hot-ish lists preserved) from the needed columns only
+    def lists_for(col):
+        return df[col].apply(split_listish).tolist() if col else [[] for _ in range(len(df))]
 
+    mech = pd.DataFrame({
+        "row_id": df.index,
+        "feats": lists_for(feats_col),
+        "weapons": lists_for(weapons_col),
+        "armor": lists_for(armor_col),
+    })
     mech = mech.merge(prim, on="row_id", how="left")
+    keep_cols = ["row_id","primary_class","primary_subclass","primary_level","feats","weapons","armor"]
+    mech_export = mech.reindex(columns=keep_cols)
 
-    # Narrative table: one concatenated text field + originals
-    narrative = df.copy()
-    narrative["row_id"] = narrative.index
+    # Narrative table: one concatenated text field + originals (narrative columns only)
+    narrative = pd.DataFrame({"row_id": df.index})
     for f in NARRATIVE_FIELDS:
-        if f not in narrative.columns:
-            narrative[f] = ""
+        narrative[f] = df[f].to_numpy() if f in df.columns else ""
     narrative["narrative_text"] = narrative[NARRATIVE_FIELDS].fillna("").agg(" \n".join, axis=1)
 
-    # Slim down “mech_export”
-    keep_cols = ["row_id","primary_class","primary_subclass","primary_level","feats","weapons","armor"]
-    mech_export = mech[keep_cols].copy()
-
     return {
         "classes_long": classes_long,   # (row_id, class, subclass, level)
         "mechanical": mech_export,      # (row_id, primary_*, feats[], weapons[], armor[])
@@ -1,16 +1,79 @@
 from typing import List, Dict, Tuple
-from collections import Counter
-import math
+import time
+import numpy as np
+
+from . import metrics
+
+CANDIDATE_POOL = metrics.histogram("recs_candidate_pool_size", "Distinct candidates blended per query", buckets=(10, 50, 100, 500, 1000, 10000, 100000))
+DEGRADED = metrics.counter("recs_degraded_components_total", "Components skipped or approximated to meet a request deadline")
+
+def topk_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k largest scores (NaN ignored), highest first; ties keep index
+    order, matching a stable sort / Counter.most_common over the same key order.
+    """
+    valid = np.flatnonzero(~np.isnan(scores))
+    if k <= 0 or valid.size == 0:
+        return valid[:0]
+    vals = scores[valid]
+    if valid.size > k:
+        thr = vals[np.argpartition(-vals, k - 1)[k - 1]]
+        keep = vals >= thr  # includes every tie at the boundary
+        valid, vals = valid[keep], vals[keep]
+    order = np.lexsort((valid, -vals))
+    return valid[order[:k]]
+
+def blend_arrays(parts: np.ndarray, weights, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """parts: (P x V) aligned score arrays -> (top-k item indices, their blended scores)."""
+    total = np.asarray(weights, dtype=float) @ np.asarray(parts, dtype=float)
+    idx = topk_indices(total, k)
+    return idx, total[idx]
+
+def _sparse_union(parts, weights, exclude=None, penalties=None, key_order: Dict[str, int] | None = None):
+    """
+    Accumulate weighted dict parts into one array over the union of keys (first-seen order,
+    or ascending key_order rank when given, so ties resolve like a scorer over that item order).
+    """
+    index: Dict[str, int] = {}
+    rows, vals = [], []
+    for sd, w in zip(parts, weights):
+        for key, v in sd.items():
+            if exclude and key in exclude:
+                continue
+            rows.append(index.setdefault(key, len(index)))
+            vals.append(w * float(v))
+    total = np.zeros(len(index))
+    np.add.at(total, np.asarray(rows, dtype=np.int64), np.asarray(vals, dtype=float))
+    if penalties:
+        for key, pen in penalties.items():
+            j = index.get(key)
+            if j is not None:
+                total[j] += pen
+    keys = list(index)
+    if key_order is not None:
+        perm = np.argsort([key_order.get(key, len(key_order)) for key in keys], kind="stable")
+        keys, total = [keys[j] for j in perm], total[perm]
+    return keys, total
 
 def blend_scores(*score_dicts: Dict[str, float], weights: List[float] | None = None, topn: int = 5) -> List[str]:
     if weights is None:
         weights = [1.0] * len(score_dicts)
-    acc = Counter()
-    for w, sd in zip(weights, score_dicts):
-        for k, v in sd.items():
-            acc[k] += w * v
-    ranked = [k for k, _ in acc.most_common() if not math.isnan(acc[k])]
-    return ranked[:topn]
+    keys, total = _sparse_union(score_dicts, weights)
+    return [keys[j] for j in topk_indices(total, topn)]
+
+def blend_topk_with_attribution(parts, weights, k: int, exclude=None, penalties=None, key_order=None):
+    """
+    Same ranking as blend_with_attribution + penalties + sort, but only the
+    top-k items are materialized. key_order: item -> rank used to break score ties.
+    returns: [(item, score)], contribs (dict[item->{part_i:score}]) for those items only
+    """
+    keys, total = _sparse_union(parts, weights, exclude=exclude, penalties=penalties, key_order=key_order)
+    CANDIDATE_POOL.observe(len(keys))
+    top = [(keys[j], float(total[j])) for j in topk_indices(total, k)]
+    contribs = {}
+    for item, _ in top:
+        contribs[item] = {f"part_{i}": w * float(sd[item]) for i, (sd, w) in enumerate(zip(parts, weights)) if item in sd}
+    return top, contribs
 
 def blend_with_attribution(parts, weights):
     """
@@ -24,3 +87,97 @@ def blend_with_attribution(parts, weights):
             final[k] = final.get(k, 0.0) + w*float(v)
             contribs.setdefault(k, {})[f"part_{i}"] = w*float(v)
     return final, contribs
+
+def cooc_similarity(M, row_weights=None):
+    """
+    Item-item cosine over co-occurrence counts from a (rows x items) incidence
+    (optionally row-weighted): (items x items) csr with sorted column indices.
+    """
+    F = M.tocsr(copy=True).astype(float)
+    if row_weights is not None:
+        F = F.multiply(np.sqrt(np.asarray(row_weights, dtype=float))[:, None]).tocsr()
+    C = (F.T @ F).tocsr()
+    norms = np.sqrt(C.diagonal())
+    norms[norms == 0] = 1.0
+    S = C.multiply(1.0 / norms[:, None]).multiply(1.0 / norms[None, :]).tocsr()
+    S.sort_indices()
+    return S
+
+def _sim_to(sim, c: int, cols: np.ndarray) -> np.ndarray:
+    """Similarities of item c to the pool columns (row slice + binary search, no scipy indexing)."""
+    lo, hi = sim.indptr[c], sim.indptr[c + 1]
+    if hi == lo:
+        return np.zeros(len(cols))
+    row = sim.indices[lo:hi]
+    pos = np.minimum(np.searchsorted(row, cols), hi - lo - 1)
+    return np.where(row[pos] == cols, sim.data[lo:hi][pos], 0.0)
+
+def mmr_rerank(candidates, k: int, sim, item_index: Dict[str, int], diversity: float = 0.0):
+    """
+    Greedy MMR over a bounded pool [(item, score)], best first: each pick maximizes
+    score - diversity * (max similarity to items already picked).
+    Only the picked items' similarity rows are read, so a query costs O(k * P log d).
+    """
+    if diversity <= 0 or len(candidates) <= 1:
+        return candidates[:k]
+    P = len(candidates)
+    cols = np.array([item_index.get(it, -1) for it, _ in candidates])
+    rel = np.array([s for _, s in candidates], dtype=float)
+    max_sim = np.zeros(P)
+    taken = np.zeros(P, dtype=bool)
+    out = []
+    for _ in range(min(k, P)):
+        mmr = rel - diversity * max_sim
+        mmr[taken] = -np.inf
+        j = int(np.argmax(mmr))  # ties go to the higher-relevance (earlier) candidate
+        out.append(candidates[j])
+        taken[j] = True
+        if cols[j] >= 0:
+            np.maximum(max_sim, _sim_to(sim, cols[j], cols), out=max_sim)
+    return out
+
+def list_similarity(items, sim, item_index: Dict[str, int]) -> float:
+    """Mean pairwise cosine similarity of a recommendation list (1 - intra-list diversity)."""
+    cols = [item_index[it] for it in items if it in item_index]
+    if len(cols) < 2:
+        return 0.0
+    S = sim[cols][:, cols].toarray()
+    n = len(cols)
+    return float((S.sum() - np.trace(S)) / (n * (n - 1)))
+
+class Budget:
+    """
+    Per-request time budget for a scorer whose components run in cost order.
+    deadline: absolute time.perf_counter() value (None = unbounded).
+    costs: running-average seconds per component, shared across requests.
+    run() skips a component (or runs its cheaper fallback) once the remaining time
+    cannot cover its usual cost; .used lists what actually ran.
+    """
+    def __init__(self, deadline=None, costs: Dict[str, float] | None = None, decay=0.2):
+        self.deadline = deadline
+        self.costs = {} if costs is None else costs
+        self.decay = decay
+        self.used: List[str] = []
+
+    def remaining(self) -> float:
+        return float("inf") if self.deadline is None else self.deadline - time.perf_counter()
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def run(self, name: str, fn, fallback=None, default=None):
+        left = self.remaining()
+        if left <= 0 or self.costs.get(name, 0.0) > left:
+            if fallback is None or left <= 0:
+                DEGRADED.inc(component=name, action="skipped")
+                return default
+            DEGRADED.inc(component=name, action="approximated")
+            self.used.append(f"{name}~")
+            return fallback()
+        t0 = time.perf_counter()
+        out = fn()
+        dt = time.perf_counter() - t0
+        prev = self.costs.get(name)
+        self.costs[name] = dt if prev is None else (1 - self.decay) * prev + self.decay * dt
+        self.used.append(name)
+        return out
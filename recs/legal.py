@@ -1,4 +1,13 @@
-from typing import List, Dict, Set
+from collections import defaultdict
+from typing import List, Dict
+import numpy as np
+from scipy import sparse
+
+from .class_eligibility import check_minima
+from .canon import base_key
+from . import metrics
+
+PENALIZED = metrics.counter("recs_legality_penalized_items_total", "Candidate items receiving a legality penalty")
 
 HEAVY_ARMOR_TOKENS = {
     "plate_armor", "half_plate", "splint", "ring_mail", "chain_mail",
@@ -6,23 +15,105 @@ HEAVY_ARMOR_TOKENS = {
 }
 HEAVY_OK = {"fighter", "paladin"}  # simple rule-of-thumb
 
-def legality_penalties(primary_class: str | None, candidates: List[str]) -> Dict[str, float]:
-    """Return additive penalties (negative) per candidate; 0 means no penalty."""
-    penalties: Dict[str, float] = {}
-    pcls = (primary_class or "").lower()
-    for c in candidates:
-        pen = 0.0
-        if c in HEAVY_ARMOR_TOKENS and pcls not in HEAVY_OK:
-            pen -= 0.25  # soft nudge down, not a hard ban
-        penalties[c] = pen
-    return penalties
-
-def apply_penalties(scores: Dict[str, float], penalties: Dict[str, float]) -> Dict[str, float]:
-    out = dict(scores)
-    for k, pen in penalties.items():
-        if k in out:
-            out[k] += pen
+MARTIAL_WEAPON_TOKENS = {
+    "battleaxe", "flail", "glaive", "greataxe", "greatsword", "halberd", "lance",
+    "maul", "morningstar", "pike", "scimitar", "trident", "war_pick", "warhammer",
+    "whip", "blowgun", "heavy_crossbow", "longbow", "net",
+}
+FINESSE_MARTIAL_TOKENS = {"hand_crossbow", "longsword", "rapier", "shortsword"}
+MARTIAL_OK = {"barbarian", "fighter", "paladin", "ranger"}
+FINESSE_OK = MARTIAL_OK | {"bard", "rogue"}
+# single-weapon proficiencies: one rule per item set, so no item is penalized twice
+DRUID_WEAPONS = {"scimitar"}
+MONK_WEAPONS  = {"shortsword"}
+
+# Declarative rule table. Each rule targets one field and a set of items:
+#   allow_classes: primary classes that may take the items without penalty
+#   requires:      ability minima (class_eligibility.check_minima format)
+RULES = [
+    {"field": "armor",   "items": HEAVY_ARMOR_TOKENS,     "allow_classes": HEAVY_OK, "penalty": -0.25},
+    {"field": "weapons", "items": MARTIAL_WEAPON_TOKENS - DRUID_WEAPONS,  "allow_classes": MARTIAL_OK, "penalty": -0.15},
+    {"field": "weapons", "items": DRUID_WEAPONS,                          "allow_classes": MARTIAL_OK | {"druid"}, "penalty": -0.15},
+    {"field": "weapons", "items": FINESSE_MARTIAL_TOKENS - MONK_WEAPONS,  "allow_classes": FINESSE_OK, "penalty": -0.15},
+    {"field": "weapons", "items": MONK_WEAPONS,                           "allow_classes": FINESSE_OK | {"monk"}, "penalty": -0.15},
+    {"field": "feats", "items": {"defensive_duelist", "skulker"}, "requires": {"dex": 13}, "penalty": -0.25},
+    {"field": "feats", "items": {"grappler", "heavily_armored"},  "requires": {"str": 13}, "penalty": -0.25},
+    {"field": "feats", "items": {"inspiring_leader"},             "requires": {"cha": 13}, "penalty": -0.25},
+    {"field": "feats", "items": {"ritual_caster"},                "requires": {"int_or_wis": 13}, "penalty": -0.25},
+]
+
+def rule_items(rules, field: str, canon: Dict[str, str] | None = None) -> set:
+    """Every item token the rules for one field name, passed through the canon map when given."""
+    items = {t for rule in rules if rule["field"] == field for t in rule["items"]}
+    return items | {canon[t] for t in items if t in (canon or {})}
+
+def compile_rules(field: str, classes: List[str], vocab: List[str], ability_rows: List[dict] | None = None, rules=RULES,
+                  canon: Dict[str, str] | None = None):
+    """
+    Compile the rule table for one field into sparse penalty matrices:
+      by_class: (C+1) x V, class proficiency rules; the last row is for unknown classes
+      by_row:   N x V, ability-score prerequisites per character (None without ability_rows)
+    canon: the field's recs.canon token -> canonical id map. Rule items are mapped through it
+    and matched on recs.canon.base_key, so spelling variants (half_plate_armor) and
+    enchanted copies (longsword_1) of a rule item are penalized like the item itself.
+    """
+    cls_index = {c: i for i, c in enumerate(classes)}
+    item_index = {t: j for j, t in enumerate(vocab)}
+    by_base = defaultdict(list)
+    for t, j in item_index.items():
+        by_base[base_key(t)].append(j)
+    n_cls = len(classes) + 1
+    ci, cj, cv = [], [], []
+    ri, rj, rv = [], [], []
+    for rule in rules:
+        if rule["field"] != field:
+            continue
+        cols = sorted({j for t in rule_items([rule], field, canon) for j in by_base.get(base_key(t), ())})
+        if not cols:
+            continue
+        if "allow_classes" in rule:
+            for i in range(n_cls):
+                if i < len(classes) and classes[i] in rule["allow_classes"]:
+                    continue
+                ci.extend([i] * len(cols)); cj.extend(cols); cv.extend([rule["penalty"]] * len(cols))
+        if "requires" in rule and ability_rows is not None:
+            abbrs = [a for key in rule["requires"] for a in key.split("_or_")]
+            for r, scores in enumerate(ability_rows):
+                if all(scores.get(a) is None for a in abbrs):
+                    continue  # no ability data: don't guess
+                ok, _ = check_minima(rule["requires"], scores)
+                if not ok:
+                    ri.extend([r] * len(cols)); rj.extend(cols); rv.extend([rule["penalty"]] * len(cols))
+    by_class = sparse.csr_matrix((cv, (ci, cj)), shape=(n_cls, len(vocab)), dtype=np.float64)
+    by_row = None
+    if ability_rows is not None:
+        by_row = sparse.csr_matrix((rv, (ri, rj)), shape=(len(ability_rows), len(vocab)), dtype=np.float64)
+    return {"field": field, "classes": cls_index, "vocab": list(vocab), "items": item_index,
+            "by_class": by_class, "by_row": by_row}
+
+def _class_rows(engine, primary_classes) -> np.ndarray:
+    unknown = len(engine["classes"])
+    return np.array([engine["classes"].get((c or "").lower(), unknown) for c in primary_classes], dtype=np.int64)
+
+def apply_legality_batch(engine, S: np.ndarray, primary_classes: List[str | None],
+                         owned: np.ndarray | None = None, row_ids: List[int] | None = None) -> np.ndarray:
+    """
+    Apply penalties to a batch of score vectors S (B x V) in one pass:
+    class rules + per-row ability rules are added, owned items (B x V bool) become -inf.
+    """
+    out = np.asarray(S, dtype=np.float64) + engine["by_class"][_class_rows(engine, primary_classes)].toarray()
+    if row_ids is not None and engine["by_row"] is not None:
+        out += engine["by_row"][np.asarray(row_ids)].toarray()
+    if owned is not None:
+        out[owned] = -np.inf
     return out
 
-def remove_duplicates(scores: Dict[str, float], owned: Set[str]) -> Dict[str, float]:
-    return {k: v for k, v in scores.items() if k not in owned}
+def row_penalties(engine, primary_class: str | None, row_id: int | None = None) -> Dict[str, float]:
+    """Non-zero penalties for a single query, read straight off the sparse rows."""
+    vocab = engine["vocab"]
+    row = engine["by_class"][_class_rows(engine, [primary_class])[0]]
+    if row_id is not None and engine["by_row"] is not None:
+        row = row + engine["by_row"][row_id]
+    out = {vocab[j]: float(v) for j, v in zip(row.indices, row.data) if v}
+    PENALIZED.inc(len(out), field=engine["field"])
+    return out
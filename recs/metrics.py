@@ -0,0 +1,131 @@
+"""
+Minimal in-process metrics (counters + histograms) with Prometheus text exposition.
+Updates are a dict lookup and an add; set REGISTRY.enabled = False to turn them off.
+"""
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Lock, Thread
+from typing import Dict, Tuple
+
+DEFAULT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 1000)
+
+def _labels_key(labels: dict) -> Tuple:
+    return tuple(sorted(labels.items())) if labels else ()
+
+def _fmt_labels(key: Tuple, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    def __init__(self, registry, name: str, help: str):
+        self.registry, self.name, self.help = registry, name, help
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, value=1.0, **labels):
+        if not self.registry.enabled:
+            return
+        key = _labels_key(labels)
+        self.values[key] = self.values.get(key, 0.0) + value
+
+    def expose(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for key, v in sorted(self.values.items()):
+            yield f"{self.name}{_fmt_labels(key)} {v:g}"
+
+class Histogram:
+    def __init__(self, registry, name: str, help: str, buckets=DEFAULT_BUCKETS):
+        self.registry, self.name, self.help = registry, name, help
+        self.buckets = tuple(sorted(buckets))
+        self.counts: Dict[Tuple, list] = {}
+        self.sums: Dict[Tuple, float] = {}
+
+    def observe(self, value: float, **labels):
+        if not self.registry.enabled:
+            return
+        key = _labels_key(labels)
+        counts = self.counts.get(key)
+        if counts is None:
+            counts = self.counts[key] = [0] * (len(self.buckets) + 1)
+            self.sums[key] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self.sums[key] += value
+
+    def expose(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for key, counts in sorted(self.counts.items()):
+            cum = 0
+            for bound, c in zip(self.buckets, counts):
+                cum += c
+                le = 'le="%g"' % bound
+                yield f"{self.name}_bucket{_fmt_labels(key, le)} {cum}"
+            cum += counts[-1]
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_fmt_labels(key, le)} {cum}"
+            yield f"{self.name}_sum{_fmt_labels(key)} {self.sums[key]:g}"
+            yield f"{self.name}_count{_fmt_labels(key)} {cum}"
+
+class Registry:
+    def __init__(self):
+        self.enabled = True
+        self.metrics: Dict[str, object] = {}
+        self._lock = Lock()
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self._lock:
+            if name not in self.metrics:
+                self.metrics[name] = cls(self, name, *args, **kwargs)
+            return self.metrics[name]
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._get(Counter, name, help)
+
+    def histogram(self, name: str, help: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def exposition(self) -> str:
+        lines = []
+        for name in sorted(self.metrics):
+            lines.extend(self.metrics[name].expose())
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        for m in self.metrics.values():
+            for attr in ("values", "counts", "sums"):
+                if hasattr(m, attr):
+                    getattr(m, attr).clear()
+
+REGISTRY = Registry()
+
+def counter(name: str, help: str) -> Counter:
+    return REGISTRY.counter(name, help)
+
+def histogram(name: str, help: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.histogram(name, help, buckets=buckets)
+
+def dump(path: str | Path, registry: Registry = REGISTRY) -> None:
+    """Write the text exposition to a file (batch scripts)."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_text(registry.exposition())
+
+def serve(port=9108, registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """Expose /metrics on a local port from a daemon thread."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = registry.exposition().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
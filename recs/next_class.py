@@ -0,0 +1,286 @@
+from typing import Dict, List
+import time
+from collections import Counter, defaultdict
+import numpy as np
+import pandas as pd
+
+from .text import nearest_neighbors
+from .class_eligibility import extract_ability_scores, check_requirement
+from .explain import next_class_record, reason_code
+from .hybrid import DEGRADED
+from . import metrics
+
+ELIGIBILITY_BANS = metrics.counter("recs_eligibility_bans_total", "Next-class candidates penalized or banned as ineligible")
+
+# weights (tweak if needed)
+W_COOCC   = 0.55    # class co-occurrence signal
+W_NEIGH   = 0.35    # narrative neighbor votes
+W_POP     = 0.10    # popularity prior
+PEN_INEL  = 1000.0  # if you want to HARD-BAN ineligible classes, set very large penalty (e.g., 1000)
+SOFT_PEN  = 0.35    # OR soft penalty to nudge down ineligible (set PEN_INEL=0 to use this)
+NEIGH_TOPN = 25
+SCORER_VERSION = 1  # bump when the next-class scoring changes; cached results of older versions are recomputed
+
+# level-aware path planner: backoff mixture over transition tables
+W_T_SUB   = 0.3     # (primary subclass, tier) -> next class
+W_T_CLS   = 0.5     # (anchor class, tier, number of classes) -> next class
+W_T_TIER  = 0.2     # (tier) -> next class
+T_SMOOTH  = 0.5     # additive smoothing per table row
+MAX_LEVEL = 20
+TIERS     = (4, 10, 16, 20)  # tiers of play by total character level
+
+def build_class_bags(classes_long: pd.DataFrame):
+    bags = defaultdict(set)
+    for _, r in classes_long.iterrows():
+        bags[int(r["row_id"])].add(str(r["class"]))
+    return bags
+
+def class_cooc(bags: dict[int, set[str]]):
+    co = defaultdict(Counter)
+    for s in bags.values():
+        ss = sorted(list(s))
+        for i in range(len(ss)):
+            for j in range(i+1, len(ss)):
+                a, b = ss[i], ss[j]
+                co[a][b] += 1
+                co[b][a] += 1
+    return co
+
+def make_next_class_recommender(mech: pd.DataFrame, classes_long: pd.DataFrame, X, original: pd.DataFrame | None = None,
+                                groups=None):
+    """
+    Hybrid next-class scorer (class co-occurrence + narrative neighbor votes + popularity,
+    with multiclass eligibility bans). Returns _rec(row_id, k=5, _neigh=None) -> (top_classes, record)
+    where record is a compact recs.explain.next_class_record;
+    pass _neigh to reuse a neighborhood computed elsewhere (sorted, at least NEIGH_TOPN long).
+    deadline (absolute time.perf_counter() value): past it, the narrative neighbor search is skipped.
+    groups: near-duplicate cluster per row, passed to the neighbor search (as the item scorers do).
+    """
+    bags = build_class_bags(classes_long)
+    co   = class_cooc(bags)
+    pop_counts = classes_long["class"].astype(str).value_counts()
+    all_classes = sorted(pop_counts.index.tolist())
+    maxc = float(pop_counts.max()) if len(pop_counts) else 1.0
+    # ability scores come from the original snapshot (mech has only the mechanical slice)
+    ability_src = original if original is not None else mech
+
+    def _rec(rid: int, k=5, _neigh=None, deadline=None):
+        owned = set(bags.get(rid, set()))
+        primary = str(mech.loc[rid, "primary_class"]) if pd.notna(mech.loc[rid, "primary_class"]) else None
+
+        # 1) co-occ candidates/scores
+        co_scores = Counter()
+        for c in owned:
+            for cand, w in co.get(c, {}).items():
+                if cand not in owned:
+                    co_scores[cand] += float(w)
+
+        # 2) narrative neighbor class votes
+        if _neigh is not None:
+            neigh = _neigh[:NEIGH_TOPN]
+        elif deadline is not None and time.perf_counter() > deadline:
+            neigh = []
+            DEGRADED.inc(component="next_class_neighbors", action="skipped")
+        else:
+            neigh = nearest_neighbors(X, rid, topn=NEIGH_TOPN, groups=groups)
+        neigh_scores = Counter()
+        for idx, w in neigh:
+            for c in bags.get(idx, set()):
+                if c not in owned:
+                    neigh_scores[c] += float(w)
+
+        # 3) popularity prior for *all* classes
+        pop_scores = {c: (pop_counts.get(c, 0) / maxc) for c in all_classes if c not in owned}
+
+        # blend (sum of weighted signals)
+        blended = Counter()
+        for key, v in co_scores.items():
+            blended[key] += W_COOCC * v
+        for key, v in neigh_scores.items():
+            blended[key] += W_NEIGH * v
+        for key, v in pop_scores.items():
+            blended[key] += W_POP * v
+
+        # never suggest current primary (“next class to take”)
+        if primary in blended:
+            del blended[primary]
+
+        scores = extract_ability_scores(ability_src.iloc[rid])
+
+        # apply penalties/bans; keep only a reason code per candidate (text rendered on demand)
+        codes = {}
+        for cand in list(blended.keys()):
+            ok, reason = check_requirement(cand, scores)
+            if not ok:
+                ELIGIBILITY_BANS.inc(mode="hard" if PEN_INEL > 0 else "soft")
+                if PEN_INEL > 0:
+                    # hard ban: set enormous negative score
+                    blended[cand] = -PEN_INEL
+                else:
+                    blended[cand] -= SOFT_PEN
+            codes[cand] = reason_code(ok, reason)
+
+        # rank & select top-k; explanation arrays only for the top-k
+        ranked = [c for c, _ in sorted(blended.items(), key=lambda x: x[1], reverse=True)]
+        topk = ranked[:k]
+        parts = [[W_COOCC * co_scores.get(c, 0.0), W_NEIGH * neigh_scores.get(c, 0.0), W_POP * pop_scores.get(c, 0.0)] for c in topk]
+        rec = next_class_record(topk, [blended[c] for c in topk], parts, [codes[c] for c in topk], primary, owned, scores)
+        return topk, rec
+
+    _rec.bags = bags
+    _rec.classes = all_classes
+    return _rec
+
+def tier_of(total_level: int) -> int:
+    for i, hi in enumerate(TIERS):
+        if total_level <= hi:
+            return i
+    return len(TIERS) - 1
+
+def _anchor(levels: Dict[int, int], order: List[int]) -> int:
+    # highest level so far, ties -> taken first (same rule as the primary class in recs.features)
+    return max(order, key=lambda c: (levels[c], -order.index(c)))
+
+def reconstruct_levels(mix: List[tuple]) -> List[int]:
+    """
+    Plausible level-up order for a final (class, level) mix, first entry first:
+    level 1 in the first class, then largest-remainder interleaving towards the final shares.
+    """
+    total = sum(l for _, l in mix)
+    have = [0] * len(mix)
+    seq = []
+    for t in range(total):
+        if t == 0:
+            j = 0
+        else:
+            j = max(range(len(mix)), key=lambda i: (mix[i][1] * (t + 1) / total - have[i], -i) if have[i] < mix[i][1] else (-1e9, 0))
+        have[j] += 1
+        seq.append(j)
+    return seq
+
+def build_transition_tables(classes_long: pd.DataFrame, mech: pd.DataFrame):
+    """
+    Next-level transition counts from classes_long, as dense count arrays:
+      by_sub  (S+1, T, C)  primary subclass (S = none) x tier
+      by_cls  (C, T, 3, C) anchor class x tier x classes so far (1, 2, 3+)
+      by_tier (T, C)
+    Rows are smoothed and normalized once so a lookup is a few array indexings.
+    """
+    cl = classes_long.dropna(subset=["class"])
+    classes = sorted(cl["class"].astype(str).unique().tolist())
+    cidx = {c: i for i, c in enumerate(classes)}
+    subs = sorted({str(s) for s in mech["primary_subclass"].dropna()})
+    sidx = {s: i for i, s in enumerate(subs)}
+    C, S, T = len(classes), len(subs), len(TIERS)
+    by_sub  = np.zeros((S + 1, T, C))
+    by_cls  = np.zeros((C, T, 3, C))
+    by_tier = np.zeros((T, C))
+
+    prim_sub = mech.set_index("row_id")["primary_subclass"]
+    for rid, g in cl.groupby("row_id", sort=False):
+        mix = [(cidx[str(c)], max(1, int(l)) if pd.notna(l) else 1) for c, l in zip(g["class"], g["level"])]
+        # primary (highest level, ties first) starts the path
+        mix.sort(key=lambda x: -x[1])
+        sub = prim_sub.get(rid)
+        s = sidx.get(str(sub), S) if pd.notna(sub) else S
+        seq = reconstruct_levels(mix)
+        levels, order = defaultdict(int), []
+        for j in seq:
+            c = mix[j][0]
+            if order:
+                t = tier_of(sum(levels.values()))
+                a = _anchor(levels, order)
+                by_sub[s, t, c] += 1
+                by_cls[a, t, min(len(order), 3) - 1, c] += 1
+                by_tier[t, c] += 1
+            if c not in levels:
+                order.append(c)
+            levels[c] += 1
+
+    def _norm(a):
+        n = a.sum(axis=-1, keepdims=True)
+        has = n[..., 0] > 0
+        return (a + T_SMOOTH) / (n + T_SMOOTH * a.shape[-1]), has
+
+    p_sub, has_sub = _norm(by_sub)
+    p_cls, has_cls = _norm(by_cls)
+    p_tier, has_tier = _norm(by_tier)
+    return {
+        "classes": classes, "class_index": cidx, "subclass_index": sidx,
+        "counts": {"by_sub": by_sub, "by_cls": by_cls, "by_tier": by_tier},
+        "p_sub": p_sub, "has_sub": has_sub, "p_cls": p_cls, "has_cls": has_cls,
+        "p_tier": p_tier, "has_tier": has_tier,
+    }
+
+def transition_probs(tables, sub: int, anchor: int, tier: int, n_classes: int) -> np.ndarray:
+    """P(next class | state) as a backoff mixture of the three tables (constant time)."""
+    parts = [(W_T_SUB, tables["p_sub"][sub, tier], tables["has_sub"][sub, tier]),
+             (W_T_CLS, tables["p_cls"][anchor, tier, min(n_classes, 3) - 1], tables["has_cls"][anchor, tier, min(n_classes, 3) - 1]),
+             (W_T_TIER, tables["p_tier"][tier], tables["has_tier"][tier])]
+    used = [(w, p) for w, p, has in parts if has]
+    if not used:
+        return np.full(len(tables["classes"]), 1.0 / len(tables["classes"]))
+    wsum = sum(w for w, _ in used)
+    return sum(w * p for w, p in used) / wsum
+
+def make_class_path_planner(mech: pd.DataFrame, classes_long: pd.DataFrame, original: pd.DataFrame | None = None, beam=5):
+    """
+    Level-aware next-class planner over build_transition_tables.
+    Returns _plan(row_id, steps=1, k=5) -> [(path [class per level], log_prob, final {class: level})],
+    best first, from a beam search that skips classes failing check_requirement
+    (classes already taken never need it again). Paths stop at MAX_LEVEL.
+    """
+    tables = build_transition_tables(classes_long, mech)
+    classes, cidx, sidx = tables["classes"], tables["class_index"], tables["subclass_index"]
+    S = len(sidx)
+    ability_src = original if original is not None else mech
+    start = {}
+    for rid, g in classes_long.dropna(subset=["class"]).groupby("row_id", sort=False):
+        mix = sorted(((cidx[str(c)], max(1, int(l)) if pd.notna(l) else 1) for c, l in zip(g["class"], g["level"])),
+                     key=lambda x: -x[1])
+        start[int(rid)] = mix
+    # per-class eligibility is fixed per character -> one vector, checked once
+    def _eligible(rid):
+        scores = extract_ability_scores(ability_src.iloc[rid])
+        return np.array([check_requirement(c, scores)[0] for c in classes])
+
+    def _plan(rid: int, steps=1, k=5):
+        mix = start.get(rid, [])
+        sub_name = mech.loc[rid, "primary_subclass"]
+        sub = sidx.get(str(sub_name), S) if pd.notna(sub_name) else S
+        elig = _eligible(rid)
+        levels = {c: l for c, l in mix}
+        order = [c for c, _ in mix]
+        beams = [(0.0, [], levels, order)]
+        for _ in range(steps):
+            cand = {}
+            for lp, path, lv, od in beams:
+                total = sum(lv.values())
+                if total >= MAX_LEVEL:
+                    key = tuple(sorted(lv.items()))
+                    if key not in cand or cand[key][0] < lp:
+                        cand[key] = (lp, path, lv, od)
+                    continue
+                if od:
+                    probs = transition_probs(tables, sub, _anchor(lv, od), tier_of(total), len(od))
+                else:
+                    probs = tables["p_tier"][0]
+                allowed = elig.copy()
+                allowed[od] = True  # levels in a class already taken need no new check
+                logp = np.log(probs)
+                for c in np.flatnonzero(allowed):
+                    c = int(c)
+                    nlv = dict(lv)
+                    nlv[c] = nlv.get(c, 0) + 1
+                    nod = od if c in lv else od + [c]
+                    key = tuple(sorted(nlv.items()))  # paths reaching the same mix are merged
+                    score = lp + float(logp[c])
+                    if key not in cand or cand[key][0] < score:
+                        cand[key] = (score, path + [classes[c]], nlv, nod)
+            if not cand:
+                break
+            beams = sorted(cand.values(), key=lambda b: b[0], reverse=True)[:max(beam, k)]
+        return [(path, lp, {classes[c]: l for c, l in lv.items()}) for lp, path, lv, _ in beams[:k]]
+
+    _plan.tables = tables
+    return _plan
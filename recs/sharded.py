@@ -0,0 +1,133 @@
+"""
+Out-of-core item co-occurrence: mechanical.parquet is processed one row group
+at a time in a process pool. Each shard returns its upper-triangle pair counts
+as compact (row, col, count) arrays and the parent sums them into one sparse model.
+"""
+import os
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from pathlib import Path
+from typing import Dict, List
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from scipy import sparse
+
+REDUCE_BATCH = 5_000_000  # buffered (row, col, count) triplets before folding into the total
+IN_FLIGHT    = 2          # shards submitted but not yet folded, per worker
+
+def _read_field(path, rg: int, field: str):
+    col = pq.ParquetFile(path).read_row_group(rg, columns=[field]).column(0)
+    return col.combine_chunks() if isinstance(col, pa.ChunkedArray) else col
+
+def _shard_vocab(path, rg: int, field: str) -> List[str]:
+    values = pc.list_flatten(_read_field(path, rg, field))
+    return pc.unique(pc.cast(values, pa.string()).drop_null()).to_pylist()
+
+def _shard_counts(path, rg: int, field: str, vocab: List[str], weights=None):
+    """(row, col, count) upper-triangle co-occurrence of one row group, item ids into vocab."""
+    col = _read_field(path, rg, field)
+    n = len(col)
+    values = pc.cast(pc.list_flatten(col), pa.string())
+    parent = pc.list_parent_indices(col).to_numpy()
+    ids = pc.index_in(values, value_set=pa.array(vocab, type=pa.string()))
+    keep = ids.is_valid().to_numpy(zero_copy_only=False)
+    ids = ids.drop_null().to_numpy()
+    parent = parent[keep]
+    # binary incidence (sets: repeated tokens in a row count once)
+    B = sparse.csr_matrix((np.ones(len(ids), dtype=np.int64), (parent, ids)), shape=(n, len(vocab)))
+    B.sum_duplicates()
+    B.data[:] = 1
+    if weights is None:
+        C = B.T @ B
+    else:
+        C = B.T @ B.multiply(np.asarray(weights, dtype=float)[:, None]).tocsr()
+    C = sparse.triu(C).tocoo()
+    n_active = n if weights is None else int((np.asarray(weights) > 0).sum())
+    return C.row.astype(np.int32), C.col.astype(np.int32), C.data, n_active
+
+def _fold(triplets, V: int):
+    r, c, d = (np.concatenate(x) for x in zip(*triplets))
+    return sparse.csr_matrix((d, (r, c)), shape=(V, V))  # duplicates are summed
+
+def row_group_shards(path) -> List[tuple]:
+    """(row group index, first row, n rows) per row group."""
+    meta = pq.ParquetFile(path).metadata
+    out, start = [], 0
+    for rg in range(meta.num_row_groups):
+        n = meta.row_group(rg).num_rows
+        out.append((rg, start, n))
+        start += n
+    return out
+
+def build_cooccurrence_sharded(path: str | Path, field: str, weights=None, drop=None, n_jobs: int | None = None,
+                               max_in_flight: int | None = None):
+    """
+    Sparse item-item co-occurrence for one list column of a parquet file.
+    weights: optional per-row weights over the whole file (0 drops a row, e.g. held-out rows).
+    drop: tokens to ignore. Returns {"vocab", "counts" (V x V csr, diagonal = item
+    counts), "n_rows"}; memory is bounded by the vocabulary plus in-flight shards:
+    at most max_in_flight (default IN_FLIGHT per worker) shard results exist at once.
+    """
+    shards = row_group_shards(path)
+    w = None if weights is None else np.asarray(weights, dtype=float)
+    with ProcessPoolExecutor(max_workers=n_jobs) as ex:
+        vocab = set()
+        for toks in ex.map(_shard_vocab, *zip(*[(path, rg, field) for rg, _, _ in shards])):
+            vocab.update(toks)
+        vocab = sorted(vocab - set(drop or ()))
+        V = len(vocab)
+        todo = iter(shards)
+        submit = lambda rg, start, n: ex.submit(_shard_counts, path, rg, field, vocab, None if w is None else w[start:start + n])
+        window = max_in_flight or IN_FLIGHT * (n_jobs or os.cpu_count() or 1)
+        running = {submit(*s) for s in islice(todo, window)}
+        # reduce: buffer shard triplets as they finish, fold into the running sum in batches; a
+        # finished future is dropped once read and replaced by the next shard (sliding window)
+        total = sparse.csr_matrix((V, V), dtype=np.int64 if w is None else float)
+        buf, buffered, n_rows = [], 0, 0
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for f in done:
+                r, c, d, n = f.result()
+                buf.append((r, c, d))
+                buffered += len(d)
+                n_rows += n
+                nxt = next(todo, None)
+                if nxt is not None:
+                    running.add(submit(*nxt))
+            del done, f, r, c, d
+            if buffered >= REDUCE_BATCH:
+                total = total + _fold(buf, V)
+                buf, buffered = [], 0
+        if buf:
+            total = total + _fold(buf, V)
+        del buf
+    upper = total.tocsr()
+    counts = (upper + sparse.triu(upper, k=1).T).tocsr()
+    counts.sort_indices()
+    return {"vocab": vocab, "counts": counts, "n_rows": n_rows}
+
+def cooc_dicts(model) -> Dict[str, Counter]:
+    """Same shape as baselines.build_cooccurrence (item -> Counter of co-occurring items)."""
+    vocab, C = model["vocab"], model["counts"]
+    diag = C.diagonal()
+    out: Dict[str, Counter] = {}
+    for a in range(len(vocab)):
+        if not diag[a]:
+            continue
+        lo, hi = C.indptr[a], C.indptr[a + 1]
+        out[vocab[a]] = Counter({vocab[b]: v for b, v in zip(C.indices[lo:hi].tolist(), C.data[lo:hi].tolist())
+                                 if b != a and v})
+    return out
+
+def item_stats(model):
+    """Same shape as baselines.build_item_stats: (n_users, item_count, pair_count[(a, b) with a < b])."""
+    vocab, C = model["vocab"], model["counts"]
+    diag = C.diagonal()
+    nz = np.flatnonzero(diag)
+    item_count = Counter(dict(zip([vocab[a] for a in nz], diag[nz].tolist())))
+    U = sparse.triu(C, k=1).tocoo()
+    pair_count = Counter({(vocab[a], vocab[b]): v for a, b, v in zip(U.row.tolist(), U.col.tolist(), U.data.tolist()) if v})
+    return model["n_rows"], item_count, pair_count
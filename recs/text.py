@@ -1,30 +1,226 @@
-from typing import Tuple, List, Dict
+from pathlib import Path
+from typing import Tuple, List, Dict, Iterable
+import numpy as np
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
+import pyarrow.parquet as pq
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize as l2_normalize
 
-def fit_tfidf(narr_df: pd.DataFrame) -> Tuple[TfidfVectorizer, any]:
+from .vocab import lists_to_sets
+from .hybrid import topk_indices
+from . import metrics
+
+NEIGHBOR_BATCH = 512  # query rows per dense (rows x N) similarity block in neighbor_weight_matrix
+NEIGHBORS_RETURNED = metrics.histogram("recs_neighbors_returned", "Narrative neighbors returned per query", buckets=(0, 5, 10, 25, 35, 50, 100))
+
+def fit_tfidf(narr_df: pd.DataFrame, fit_rows: List[int] | None = None) -> Tuple[TfidfVectorizer, any]:
+    # fit_rows: fit vocabulary/idf on a subset (e.g. deduplicated representatives), transform all rows
     vec = TfidfVectorizer(min_df=1, max_df=0.9, ngram_range=(1,2))
-    X = vec.fit_transform(narr_df["narrative_text"].fillna(""))
+    texts = narr_df["narrative_text"].fillna("")
+    if fit_rows is None:
+        X = vec.fit_transform(texts)
+    else:
+        vec.fit(texts.iloc[fit_rows])
+        X = vec.transform(texts)
     return vec, X
 
-def nearest_neighbors(X, row_index: int, topn=25) -> List[tuple[int, float]]:
+def fit_field_tfidf(narr_df: pd.DataFrame, fields: List[str], fit_rows: List[int] | None = None) -> Dict[str, sparse.csr_matrix]:
+    """
+    Per-field tf-idf matrices over one vocabulary/idf (fitted on narrative_text like
+    fit_tfidf) without row normalization, so combine_fields at equal weights gives
+    almost the same vector as fit_tfidf. Only bigrams that span two fields are lost.
+    """
+    vec = TfidfVectorizer(min_df=1, max_df=0.9, ngram_range=(1,2), norm=None)
+    texts = narr_df["narrative_text"].fillna("")
+    vec.fit(texts if fit_rows is None else texts.iloc[fit_rows])
+    return {f: vec.transform(narr_df[f].fillna("").astype(str)).tocsr() for f in fields if f in narr_df.columns}
+
+def combine_fields(mats: Dict[str, sparse.csr_matrix], weights: Dict[str, float]):
+    """Weighted sum of per-field tf-idf matrices, l2-normalized per row (the query-time narrative X)."""
+    shape = next(iter(mats.values())).shape
+    X = sparse.csr_matrix(shape)
+    for f, M in mats.items():
+        w = float(weights.get(f, 0.0))
+        if w:
+            X = X + M * w
+    return l2_normalize(X.tocsr())
+
+def save_field_vectors(path: str | Path, mats: Dict[str, sparse.csr_matrix], key: str) -> None:
+    """One .npz per field plus the key (input fingerprint) they were built from."""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    for f, M in mats.items():
+        sparse.save_npz(path / f"{f}.npz", M)
+    (path / "key.txt").write_text("\n".join([key] + list(mats)))
+
+def load_field_vectors(path: str | Path, key: str) -> Dict[str, sparse.csr_matrix] | None:
+    """Cached per-field matrices, or None when missing or built from different inputs."""
+    path = Path(path)
+    if not (path / "key.txt").exists():
+        return None
+    stored, *fields = (path / "key.txt").read_text().splitlines()
+    if stored != key or not all((path / f"{f}.npz").exists() for f in fields):
+        return None
+    return {f: sparse.load_npz(path / f"{f}.npz").tocsr() for f in fields}
+
+class HashingTfidf:
+    """
+    Bounded-memory alternative to fit_tfidf: uni/bigrams hashed into n_features
+    buckets, document frequencies accumulated chunk by chunk (partial_fit), so
+    memory is fixed and new characters can be transformed without refitting.
+    Mirrors fit_tfidf's smooth idf and max_df cut.
+    """
+    def __init__(self, n_features=2**18, max_df=0.9, ngram_range=(1, 2)):
+        self.max_df = max_df
+        self.hasher = HashingVectorizer(n_features=n_features, ngram_range=ngram_range,
+                                        alternate_sign=False, norm=None)
+        self.df = np.zeros(n_features, dtype=np.int64)
+        self.n_docs = 0
+
+    def partial_fit(self, texts: Iterable[str]):
+        H = self.hasher.transform(texts)
+        self.df += np.bincount(H.indices, minlength=self.df.size)  # each row's indices are unique
+        self.n_docs += H.shape[0]
+        return self
+
+    @property
+    def idf(self) -> np.ndarray:
+        idf = np.log((1.0 + self.n_docs) / (1.0 + self.df)) + 1.0
+        idf[self.df > self.max_df * self.n_docs] = 0.0
+        return idf
+
+    def transform(self, texts: Iterable[str]):
+        H = self.hasher.transform(texts).tocsr()
+        H.data *= self.idf[H.indices]
+        H.eliminate_zeros()
+        return l2_normalize(H)
+
+def iter_narrative_chunks(path: str | Path, batch_size=10_000) -> Iterable[List[str]]:
+    """Stream narrative_text from a parquet file, one record batch at a time."""
+    pf = pq.ParquetFile(path)
+    for batch in pf.iter_batches(batch_size=batch_size, columns=["narrative_text"]):
+        yield [t if isinstance(t, str) else "" for t in batch.column(0).to_pylist()]
+
+def fit_hashing_tfidf(source, n_features=2**18, batch_size=10_000) -> Tuple[HashingTfidf, any]:
+    """
+    source: narrative DataFrame, or a narrative parquet path streamed by row batches
+    (two passes: document frequencies first, then vectors). Returns (vectorizer, X) like fit_tfidf.
+    """
+    vec = HashingTfidf(n_features=n_features)
+    if isinstance(source, pd.DataFrame):
+        texts = source["narrative_text"].fillna("").tolist()
+        chunks = lambda: (texts[i:i + batch_size] for i in range(0, len(texts), batch_size))
+    else:
+        chunks = lambda: iter_narrative_chunks(source, batch_size)
+    for chunk in chunks():
+        vec.partial_fit(chunk)
+    X = sparse.vstack([vec.transform(chunk) for chunk in chunks()], format="csr")
+    return vec, X
+
+def nearest_neighbors(X, row_index: int, topn=25, groups=None) -> List[tuple[int, float]]:
     sims = cosine_similarity(X[row_index], X).ravel()
-    order = sims.argsort()[::-1]
-    return [(idx, float(sims[idx])) for idx in order if idx != row_index][:topn]
-
-def neighbor_token_scores(
-    neighbors: List[tuple[int, float]],
-    token_series: pd.Series,
-    exclude: set
-) -> Dict[str, float]:
-    """Turn narrative neighbors into token scores for feats/weapons/armor."""
-    scores: Dict[str, float] = {}
-    for idx, w in neighbors:
-        toks = token_series.iloc[idx]
-        if isinstance(toks, list):
-            for t in toks:
-                if t in exclude: 
+    k = min(len(sims), 2 * topn + 1)
+    while True:
+        order = topk_indices(sims, k)  # highest first, ties -> lower row id
+        if groups is None:
+            out = [(idx, float(sims[idx])) for idx in order if idx != row_index][:topn]
+        else:
+            # groups: duplicate-cluster id per row -> skip the query's own cluster, one neighbor per cluster
+            seen = {groups[row_index]}
+            out = []
+            for idx in order:
+                g = groups[idx]
+                if g in seen:
                     continue
-                scores[t] = scores.get(t, 0.0) + w
-    return scores
+                seen.add(g)
+                out.append((idx, float(sims[idx])))
+                if len(out) >= topn:
+                    break
+        if len(out) >= topn or k >= len(sims):
+            break
+        k = min(len(sims), 2 * k)  # too many skipped duplicates: look deeper
+    NEIGHBORS_RETURNED.observe(len(out))
+    return out
+
+def incidence_matrix(token_sets, vocab: Dict[str, int] | None = None):
+    """
+    User-item incidence (N x V, csr) from per-row token collections
+    (a Series of lists/arrays or a list of sets). Returns (M, vocab list).
+    """
+    if isinstance(token_sets, pd.Series):
+        token_sets = lists_to_sets(token_sets)
+    if vocab is None:
+        vocab = {}
+        for s in token_sets:
+            for t in sorted(s):
+                vocab.setdefault(t, len(vocab))
+    rows, cols = [], []
+    for i, s in enumerate(token_sets):
+        for t in s:
+            j = vocab.get(t)
+            if j is not None:
+                rows.append(i); cols.append(j)
+    M = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(token_sets), len(vocab)))
+    return M, list(vocab)
+
+def neighbor_weights(neighbors: List[tuple[int, float]], n_rows: int):
+    """One query's neighbor list as a sparse (1 x N) weight row."""
+    idx = [i for i, _ in neighbors]
+    w = [float(v) for _, v in neighbors]
+    return sparse.csr_matrix((w, ([0] * len(idx), idx)), shape=(1, n_rows))
+
+def neighbor_weight_matrix(X, row_ids: List[int], topn=25, groups=None, batch=NEIGHBOR_BATCH):
+    """
+    Batch version of nearest_neighbors: (B x N) csr with topn cosine weights per row (self excluded).
+    groups: duplicate-cluster id per row -> the query's own cluster is skipped, one neighbor per cluster.
+    Similarities are computed `batch` query rows at a time, so memory stays O(batch x N).
+    """
+    row_ids = np.asarray(row_ids, dtype=np.int64)
+    if len(row_ids) <= batch:
+        return _neighbor_weight_block(X, row_ids, topn, groups)
+    return sparse.vstack([_neighbor_weight_block(X, row_ids[i:i + batch], topn, groups)
+                          for i in range(0, len(row_ids), batch)], format="csr")
+
+def _neighbor_weight_block(X, row_ids: np.ndarray, topn: int, groups):
+    sims = cosine_similarity(X[row_ids], X)
+    sims[np.arange(len(row_ids)), row_ids] = -np.inf
+    if groups is not None:
+        groups = np.asarray(groups)
+        sims[groups[row_ids][:, None] == groups[None, :]] = -np.inf
+        _, inverse, sizes = np.unique(groups, return_inverse=True, return_counts=True)
+        for g in np.flatnonzero(sizes > 1):
+            cols = np.flatnonzero(inverse == g)
+            best = cols[sims[:, cols].argmax(axis=1)]
+            keep = sims[np.arange(len(row_ids)), best]
+            sims[:, cols] = -np.inf
+            sims[np.arange(len(row_ids)), best] = keep
+    k = min(topn, sims.shape[1] - 1)
+    if k <= 0:
+        return sparse.csr_matrix((len(row_ids), sims.shape[1]))
+    # k largest per row; ties at the k-th value go to the lower row ids, as in nearest_neighbors
+    kth = np.partition(sims, -k, axis=1)[:, -k][:, None]
+    ties = sims == kth
+    need = k - (sims > kth).sum(axis=1, keepdims=True)
+    keep = (sims > kth) | (ties & (np.cumsum(ties, axis=1) <= need))
+    keep &= np.isfinite(sims)
+    rows, cols = np.nonzero(keep)
+    return sparse.csr_matrix((sims[rows, cols], (rows, cols)), shape=sims.shape)
+
+def neighbor_item_scores(W, M, owned=None):
+    """
+    Neighbor-item scores for a batch in one product: (B x N) weights @ (N x V) incidence.
+    owned: optional (B x V) incidence of items to mask out.
+    """
+    S = (W @ M).tocsr()
+    if owned is not None:
+        S = (S - S.multiply(owned.astype(bool))).tocsr()
+        S.eliminate_zeros()
+    return S
+
+def sparse_row_to_dict(row, vocab: List[str], exclude: set | None = None) -> Dict[str, float]:
+    """Non-zero entries of a (1 x V) sparse row as {token: score}."""
+    row = row.tocsr()
+    exclude = exclude or set()
+    return {vocab[j]: float(v) for j, v in zip(row.indices, row.data) if vocab[j] not in exclude}
@@ -1,4 +1,4 @@
-import json, math, random, numpy as np
+import json, math, random, time, numpy as np
 from pathlib import Path
 
 def sample_simplex(n=3, num=100, kind="dirichlet", seed=42):
@@ -29,3 +29,88 @@ def load_weights(path: Path, fallback: dict):
         except Exception:
             return fallback
     return fallback
+
+def refine_around(center, num=20, concentration=50.0, seed=42):
+    """Dirichlet samples concentrated around an existing weight vector."""
+    rng = np.random.default_rng(seed)
+    alpha = np.asarray(center, dtype=float) * concentration + 1e-3
+    out = rng.dirichlet(alpha=alpha, size=num)
+    return [tuple(map(float, row)) for row in out]
+
+def successive_halving(candidates, eval_fn, row_ids, eta=3, min_rows=16,
+                       deadline=None, history=None, stage=0, seed=42):
+    """
+    Evaluate candidates on growing row subsets and keep the top 1/eta each rung.
+    eval_fn(weights, row_ids) -> score (higher is better)
+    deadline: absolute time.perf_counter() value; stops early once it passes.
+    Returns (best_score, best_weights) from the largest rung reached.
+    """
+    rows = list(row_ids)
+    random.Random(seed).shuffle(rows)
+    pool = list(candidates)
+    n_rows = min(len(rows), max(min_rows, len(rows) // (eta ** 2)))
+    best = (-1.0, pool[0] if pool else None)
+    rung = 0
+    while pool and rows:
+        subset = rows[:n_rows]
+        scored = []
+        for w in pool:
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            s = float(eval_fn(w, subset))
+            scored.append((s, w))
+            if history is not None:
+                history.append({"stage": stage, "rung": rung, "rows": len(subset),
+                                "weights": list(map(float, w)), "score": s})
+        if not scored:
+            break
+        scored.sort(key=lambda x: x[0], reverse=True)
+        best = scored[0]
+        if n_rows >= len(rows) or len(scored) < len(pool) or len(scored) == 1:
+            break
+        pool = [w for _, w in scored[:max(1, len(scored) // eta)]]
+        n_rows = min(len(rows), n_rows * eta)
+        rung += 1
+    return best
+
+def tune_weights(eval_fn, row_ids, n=3, num=100, refine_rounds=2, refine_num=20,
+                 eta=3, min_rows=16, time_budget=None, history=None, seed=42, deadline=None):
+    """
+    Budget-aware weight search: successive halving over Dirichlet + grid
+    candidates, then repeated halving over samples refined around the best.
+    time_budget is wall-clock seconds for the whole search (None = unbounded);
+    deadline: absolute time.perf_counter() value shared by several searches (wins over time_budget).
+    Returns (-1.0, weights) when the deadline had passed before anything was scored.
+    """
+    if deadline is None and time_budget is not None:
+        deadline = time.perf_counter() + time_budget
+    cand = sample_simplex(n=n, num=num, kind="dirichlet", seed=seed)
+    if n == 3:
+        cand += sample_simplex(n=3, num=0, kind="grid")
+    best = successive_halving(cand, eval_fn, row_ids, eta=eta, min_rows=min_rows,
+                              deadline=deadline, history=history, stage=0, seed=seed)
+    for r in range(refine_rounds):
+        if best[1] is None or (deadline is not None and time.perf_counter() > deadline):
+            break
+        concentration = 20.0 * (2 ** r)
+        cand = [best[1]] + refine_around(best[1], num=refine_num, concentration=concentration, seed=seed + r + 1)
+        found = successive_halving(cand, eval_fn, row_ids, eta=eta, min_rows=min_rows,
+                                   deadline=deadline, history=history, stage=r + 1, seed=seed)
+        if found[1] is not None and found[0] >= best[0]:
+            best = found
+    return best
+
+def tune_scalar(eval_fn, row_ids, values, eta=3, min_rows=16, time_budget=None, history=None, seed=42, deadline=None):
+    """
+    Successive halving over a 1-d grid (e.g. a diversity weight); candidates are
+    passed to eval_fn as 1-tuples. Returns (best_score, best_value).
+    """
+    if deadline is None and time_budget is not None:
+        deadline = time.perf_counter() + time_budget
+    score, best = successive_halving([(float(v),) for v in values], eval_fn, row_ids, eta=eta,
+                                     min_rows=min_rows, deadline=deadline, history=history, seed=seed)
+    return score, (None if best is None else best[0])
+
+def save_trials(path: Path, history: list):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(history, indent=2))
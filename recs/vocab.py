@@ -4,8 +4,12 @@ from typing import Dict, List
 import ast
 import numpy as np
 
-def load_mechanical(path: str | Path) -> pd.DataFrame:
-    return pd.read_parquet(path)
+from .dataio import read_parquet
+
+MECH_COLUMNS = ["row_id", "primary_class", "primary_subclass", "primary_level", "feats", "weapons", "armor"]
+
+def load_mechanical(path: str | Path, columns: List[str] | None = None) -> pd.DataFrame:
+    return read_parquet(path, columns=columns or MECH_COLUMNS)
 
 def build_vocab(series_of_lists: pd.Series) -> Dict[str, int]:
     tokens = series_of_lists.explode().dropna().astype(str)
@@ -0,0 +1,61 @@
+"""
+Micro-benchmark: dict blend + full sort (blend_with_attribution) vs streaming
+top-k blend (blend_topk_with_attribution / blend_arrays) on synthetic vocabularies.
+"""
+import time
+import numpy as np
+
+from recs.hybrid import blend_with_attribution, blend_topk_with_attribution, blend_arrays
+
+SIZES   = [1_000, 10_000, 100_000]
+WEIGHTS = [0.35, 0.45, 0.10, 0.10]
+K       = 5
+REPEATS = 5
+
+def make_parts(V: int, seed=42):
+    rng = np.random.default_rng(seed)
+    vocab = [f"item_{i}" for i in range(V)]
+    parts = []
+    for density in (0.01, 0.05, 1.0, 0.1):  # itemknn pool, neighbors, global prior, class slice
+        idx = rng.choice(V, size=max(1, int(V * density)), replace=False)
+        parts.append({vocab[i]: float(v) for i, v in zip(idx, rng.random(len(idx)))})
+    owned = set(vocab[:3])
+    return vocab, parts, owned
+
+def timeit(fn):
+    best = float("inf")
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+def main():
+    print(f"{'V':>8} {'dict+sort ms':>13} {'topk ms':>9} {'arrays ms':>10} {'speedup':>8}")
+    for V in SIZES:
+        vocab, parts, owned = make_parts(V)
+
+        def old():
+            final, contribs = blend_with_attribution(parts, WEIGHTS)
+            final = {k: v for k, v in final.items() if k not in owned}
+            return [k for k, _ in sorted(final.items(), key=lambda x: x[1], reverse=True)[:K]]
+
+        def new():
+            top, _ = blend_topk_with_attribution(parts, WEIGHTS, K, exclude=owned)
+            return [k for k, _ in top]
+
+        index = {t: i for i, t in enumerate(vocab)}
+        dense = np.zeros((len(parts), V))
+        for p, sd in enumerate(parts):
+            for t, v in sd.items():
+                dense[p, index[t]] = v
+        dense[:, [index[t] for t in owned]] = np.nan
+
+        t_old, r_old = timeit(old)
+        t_new, r_new = timeit(new)
+        t_arr, _     = timeit(lambda: blend_arrays(dense, WEIGHTS, K))
+        assert r_old == r_new, "ranking mismatch"
+        print(f"{V:>8} {t_old*1e3:>13.2f} {t_new*1e3:>9.2f} {t_arr*1e3:>10.2f} {t_old/t_new:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
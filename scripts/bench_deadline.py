@@ -0,0 +1,50 @@
+"""
+Latency / quality of the hybrid item scorer under per-request deadlines:
+recall@5 (leave-one-out), latency percentiles and which components ran.
+"""
+import random, time
+from collections import Counter
+import numpy as np
+
+from recs.vocab import load_mechanical
+from recs.dataio import read_parquet, parquet_columns
+from recs.text import fit_tfidf
+from recs.dedup import duplicate_clusters, representatives
+from recs.class_eligibility import extract_ability_scores, ability_columns
+from scripts.hybrid_eval import eval_field, make_sets, MECH, NARR, ORIG
+
+FIELD   = "weapons"
+BUDGETS = (None, 0.005, 0.001, 0.0002, 0.0)  # seconds per request
+
+def main():
+    mech = load_mechanical(MECH)
+    narr = read_parquet(NARR, columns=["row_id", "narrative_text"])
+    clusters = duplicate_clusters(mech, narr)
+    _, X = fit_tfidf(narr, fit_rows=representatives(clusters))
+    abilities = None
+    if ORIG.exists():
+        original = read_parquet(ORIG, columns=ability_columns(parquet_columns(ORIG)))
+        abilities = [extract_ability_scores(r) for _, r in original.iterrows()]
+    rec = eval_field(FIELD, mech, X, narr, abilities, clusters)
+    sets = make_sets(mech[FIELD])
+    rows = [i for i, s in enumerate(sets) if s]
+
+    print(f"\n{'budget':>8} {'R@5':>6} {'p50 ms':>7} {'p95 ms':>7}  components")
+    for budget in BUDGETS:
+        rng = random.Random(42)
+        hits, lat, used = 0, [], Counter()
+        for rid in rows:
+            target = rng.choice(sorted(sets[rid]))
+            known = sets[rid] - {target}
+            t0 = time.perf_counter()
+            items, r = rec(rid, k=5, _known_override=known, deadline=None if budget is None else t0 + budget)
+            lat.append(time.perf_counter() - t0)
+            hits += target in items
+            used.update(r["components"])
+        lat = np.array(lat) * 1e3
+        label = "none" if budget is None else f"{budget * 1e3:g}ms"
+        comps = " ".join(f"{c}:{n}" for c, n in sorted(used.items()))
+        print(f"{label:>8} {hits / len(rows):6.3f} {np.percentile(lat, 50):7.2f} {np.percentile(lat, 95):7.2f}  {comps}")
+
+if __name__ == "__main__":
+    main()
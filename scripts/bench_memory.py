@@ -0,0 +1,54 @@
+"""
+Peak-RSS benchmark for the parquet read path: default full-table reads vs
+projected reads with categorical/Arrow-string dtypes, on the bundled tables
+replicated SCALE times. Each variant runs in a fresh process.
+"""
+from pathlib import Path
+import resource
+import subprocess
+import sys
+import tempfile
+import pandas as pd
+
+from recs.dataio import write_parquet, read_parquet, parquet_columns
+from recs.class_eligibility import ability_columns
+
+SRC   = Path("processed")
+SCALE = 2000
+TABLES = ["mechanical", "narrative", "original_snapshot", "classes_long"]
+
+def build_dataset(out_dir: Path):
+    for name in TABLES:
+        df = pd.read_parquet(SRC / f"{name}.parquet")
+        big = pd.concat([df] * SCALE, ignore_index=True)
+        if "row_id" in big.columns:
+            big["row_id"] = range(len(big)) if name != "classes_long" else big["row_id"]
+        write_parquet(big, out_dir / f"{name}.parquet")
+
+def load(mode: str, d: Path):
+    if mode == "default":
+        frames = [pd.read_parquet(d / f"{t}.parquet") for t in TABLES]
+    else:
+        frames = [
+            read_parquet(d / "mechanical.parquet"),
+            read_parquet(d / "narrative.parquet", columns=["row_id", "narrative_text"]),
+            read_parquet(d / "original_snapshot.parquet", columns=ability_columns(parquet_columns(d / "original_snapshot.parquet"))),
+            read_parquet(d / "classes_long.parquet", columns=["row_id", "class"]),
+        ]
+    frame_mb = sum(f.memory_usage(deep=True).sum() for f in frames) / 1e6
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+    print(f"{peak_mb:.1f} {frame_mb:.1f}")
+
+def main():
+    if len(sys.argv) == 3:
+        return load(sys.argv[1], Path(sys.argv[2]))
+    with tempfile.TemporaryDirectory() as tmp:
+        build_dataset(Path(tmp))
+        print(f"dataset: bundled tables x{SCALE}")
+        print(f"{'mode':>8} {'peak RSS MB':>12} {'frames MB':>10}")
+        for mode in ["default", "pruned"]:
+            out = subprocess.check_output([sys.executable, __file__, mode, tmp], text=True).split()
+            print(f"{mode:>8} {float(out[0]):>12.1f} {float(out[1]):>10.1f}")
+
+if __name__ == "__main__":
+    main()
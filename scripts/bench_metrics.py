@@ -0,0 +1,69 @@
+"""
+Overhead of the recs.metrics instrumentation on the per-query path
+(narrative neighbors + next-class scoring + item blend), metrics on vs off.
+"""
+import time
+from pathlib import Path
+
+from recs import metrics
+from recs.vocab import load_mechanical, lists_to_sets
+from recs.dataio import read_parquet
+from recs.text import fit_tfidf, nearest_neighbors
+from recs.next_class import make_next_class_recommender, NEIGH_TOPN
+from recs.hybrid import blend_topk_with_attribution
+
+MECH  = Path("processed/mechanical.parquet")
+NARR  = Path("processed/narrative.parquet")
+CLONG = Path("processed/classes_long.parquet")
+QUERIES = 300
+REPEATS = 15
+
+def main():
+    mech = load_mechanical(MECH)
+    narr = read_parquet(NARR, columns=["row_id", "narrative_text"])
+    cl   = read_parquet(CLONG, columns=["row_id", "class"])
+    _, X = fit_tfidf(narr)
+    rec_next = make_next_class_recommender(mech, cl, X)
+    feats = lists_to_sets(mech["feats"])
+    rows = list(range(min(QUERIES, len(mech))))
+
+    def run():
+        for rid in rows:
+            neigh = nearest_neighbors(X, rid, topn=NEIGH_TOPN)
+            rec_next(rid, k=5, _neigh=neigh)
+            votes = {}
+            for j, s in neigh:
+                for t in feats[j]:
+                    votes[t] = votes.get(t, 0.0) + s
+            blend_topk_with_attribution([votes], [1.0], 5, exclude=feats[rid])
+
+    best = {True: float("inf"), False: float("inf")}
+    for _ in range(REPEATS):
+        for enabled in (False, True):  # interleave so drift hits both modes
+            metrics.REGISTRY.enabled = enabled
+            t0 = time.perf_counter()
+            run()
+            best[enabled] = min(best[enabled], time.perf_counter() - t0)
+    metrics.REGISTRY.enabled = True
+
+    # wall-clock deltas this small are noisy; also bound the overhead from the per-call cost
+    metrics.REGISTRY.reset()
+    run()
+    calls = sum(sum(m.values.values()) if isinstance(m, metrics.Counter)
+                else sum(sum(c) for c in m.counts.values())
+                for m in metrics.REGISTRY.metrics.values()) / len(rows)
+    h = metrics.histogram("bench_probe", "benchmark probe")
+    t0 = time.perf_counter()
+    for i in range(100_000):
+        h.observe(i % 50)
+    per_call = (time.perf_counter() - t0) / 100_000
+
+    off, on = best[False] / len(rows), best[True] / len(rows)
+    print(f"queries: {len(rows)}  repeats: {REPEATS}")
+    print(f"metrics off: {off*1e3:.3f} ms/query")
+    print(f"metrics on : {on*1e3:.3f} ms/query")
+    print(f"measured overhead : {(on - off) / off * 100:+.2f}%")
+    print(f"update cost       : {calls:.1f} updates/query x {per_call*1e6:.2f} us = {calls * per_call / off * 100:.3f}% of a query")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Sharded co-occurrence build (recs.sharded) vs the in-memory
+baselines.build_cooccurrence on a synthetic multi-row-group parquet, then
+peak parent RSS of the sharded build as the number of row groups grows
+(each size runs in a fresh process; it should stay flat).
+
+    python scripts/bench_sharded_cooc.py          # both parts
+    python scripts/bench_sharded_cooc.py --rss    # peak RSS only
+"""
+import os, resource, subprocess, sys, tempfile, time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from recs import sharded
+from recs.baselines import build_cooccurrence
+from recs.sharded import build_cooccurrence_sharded, cooc_dicts
+
+N_ROWS   = 300_000
+VOCAB    = 2_000
+ROW_GROUP = 25_000
+JOBS     = (1, 2, 4)
+RSS_SHARDS = (4, 16, 64, 128)  # row groups of RSS_ROW_GROUP rows
+RSS_ROW_GROUP = 20_000
+RSS_VOCAB  = 2_000              # uniform items: ~140k distinct pairs per shard, the total saturates near V^2/2
+RSS_REDUCE_BATCH = 500_000     # small fold batch so the bound is reached within the smallest sizes
+
+def make_parquet(path: Path, seed=42):
+    rng = np.random.default_rng(seed)
+    lens = rng.integers(0, 8, size=N_ROWS)
+    ranks = rng.zipf(1.3, size=int(lens.sum())) % VOCAB  # skewed, like real item popularity
+    items = np.array([f"item_{i}" for i in range(VOCAB)], dtype=object)[ranks]
+    rows = np.split(items, np.cumsum(lens)[:-1])
+    pd.DataFrame({"row_id": np.arange(N_ROWS), "feats": [list(r) for r in rows]}).to_parquet(path, row_group_size=ROW_GROUP)
+    return [set(r) for r in rows]
+
+def main():
+    path = Path(tempfile.mkdtemp()) / "mechanical.parquet"
+    sets = make_parquet(path)
+    t0 = time.perf_counter()
+    ref = build_cooccurrence(sets)
+    t_ref = time.perf_counter() - t0
+    print(f"rows={N_ROWS} row_groups={-(-N_ROWS // ROW_GROUP)} cores={os.cpu_count()}")
+    print(f"{'in-memory dicts':>18}: {t_ref:7.2f} s")
+    for n_jobs in JOBS:
+        t0 = time.perf_counter()
+        model = build_cooccurrence_sharded(path, "feats", n_jobs=n_jobs)
+        t = time.perf_counter() - t0
+        print(f"{'sharded, ' + str(n_jobs) + ' jobs':>18}: {t:7.2f} s  ({t_ref / t:.1f}x)  nnz={model['counts'].nnz}")
+    got = cooc_dicts(model)
+    assert {k: dict(v) for k, v in ref.items()} == {k: dict(v) for k, v in got.items()}, "count mismatch"
+    print(f"peak RSS (parent): {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def write_row_groups(path: Path, n_groups: int, seed=42):
+    """Synthetic parquet written one row group at a time (the writer never holds the whole file)."""
+    rng = np.random.default_rng(seed)
+    names = np.array([f"item_{i}" for i in range(RSS_VOCAB)], dtype=object)
+    schema = pa.schema([("row_id", pa.int64()), ("feats", pa.list_(pa.string()))])
+    with pq.ParquetWriter(path, schema) as w:
+        for g in range(n_groups):
+            lens = rng.integers(0, 8, size=RSS_ROW_GROUP)
+            ranks = rng.integers(0, RSS_VOCAB, size=int(lens.sum()))
+            rows = [list(r) for r in np.split(names[ranks], np.cumsum(lens)[:-1])]
+            w.write_table(pa.table({"row_id": np.arange(g * RSS_ROW_GROUP, (g + 1) * RSS_ROW_GROUP), "feats": rows}, schema=schema))
+
+def rss_child(path: str):
+    sharded.REDUCE_BATCH = RSS_REDUCE_BATCH
+    before = _peak_rss_mb()
+    t0 = time.perf_counter()
+    model = build_cooccurrence_sharded(path, "feats", n_jobs=2)
+    print(f"{before:.0f} {_peak_rss_mb():.0f} {time.perf_counter() - t0:.2f} {model['n_rows']} {model['counts'].nnz}")
+
+def rss_main():
+    print(f"\npeak parent RSS by shard count (row groups of {RSS_ROW_GROUP} rows, 2 jobs, "
+          f"in-flight window {sharded.IN_FLIGHT} per job, REDUCE_BATCH={RSS_REDUCE_BATCH})")
+    print(f"{'shards':>7} {'rows':>10} {'nnz':>10} {'startup MB':>11} {'peak MB':>8} {'build MB':>9} {'s':>6}")
+    for n_groups in RSS_SHARDS:
+        path = Path(tempfile.mkdtemp()) / "mechanical.parquet"
+        write_row_groups(path, n_groups)
+        out = subprocess.run([sys.executable, __file__, "--rss-child", str(path)], check=True,
+                             capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=os.getcwd())).stdout.split()
+        before, peak, secs, n_rows, nnz = float(out[0]), float(out[1]), float(out[2]), int(out[3]), int(out[4])
+        print(f"{n_groups:>7} {n_rows:>10} {nnz:>10} {before:>11.0f} {peak:>8.0f} {peak - before:>9.0f} {secs:>6.2f}")
+        path.unlink()
+
+if __name__ == "__main__":
+    if "--rss-child" in sys.argv:
+        rss_child(sys.argv[-1])
+    elif "--rss" in sys.argv:
+        rss_main()
+    else:
+        main()
+        rss_main()
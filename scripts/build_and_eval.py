@@ -8,13 +8,45 @@ from recs.baselines import (
     topn_popularity, build_cooccurrence, build_item_stats,
     recommend_popularity, recommend_itemknn, recommend_itemknn_pmi
 )
-from recs.evaluate import loo_eval_per_field
+from recs.evaluate import loo_eval_per_field, kfold_eval
+from recs.dedup import duplicate_clusters
+from recs import metrics
 
 MECH = Path("processed/mechanical.parquet")
+KS   = (1, 5, 10)
+METRICS_OUT  = Path("processed/metrics_baselines.prom")
+POP_FALLBACK = metrics.counter("recs_popularity_fallback_total", "ItemKNN queries answered by the popularity fallback")
+JUNK = {"", "none", "n_a", "na", "n", "weapon", "armor", "unarmed"}
 
-def run_field(name: str, series: pd.Series):
+# module-level model builders so k-fold folds can be built in worker processes
+def build_pop_model(train_sets):
+    pop_list = topn_popularity(train_sets, n=200)
+    def rec(known, k=5):
+        return recommend_popularity(pop_list, known, k)
+    return rec
+
+def build_knn_model(train_sets):
+    pop_list = topn_popularity(train_sets, n=200)
+    cooc     = build_cooccurrence(train_sets)
+    def rec(known, k=5):
+        out = recommend_itemknn(known, cooc, k) if known else []
+        return out or recommend_popularity(pop_list, known, k)
+    return rec
+
+def build_pmi_model(train_sets):
+    pop_list = topn_popularity(train_sets, n=200)
+    _, item_count, pair_count = build_item_stats(train_sets)
+    def rec(known, k=5):
+        out = recommend_itemknn_pmi(known, item_count, pair_count, k) if known else []
+        return out or recommend_popularity(pop_list, known, k)
+    return rec
+
+def fmt_metrics(m: dict) -> str:
+    parts = [f"R@{k}:{m[f'recall@{k}']:.3f} MRR@{k}:{m[f'mrr@{k}']:.3f} NDCG@{k}:{m[f'ndcg@{k}']:.3f} Cov@{k}:{m.get(f'coverage@{k}', 0.0):.2f}" for k in KS]
+    return " | ".join(parts) + f"  (n={m['n']})"
+
+def run_field(name: str, series: pd.Series, groups=None):
     # sets + quick debug
-    JUNK = {"", "none", "n_a", "na", "n", "weapon", "armor", "unarmed"}
     raw_sets = lists_to_sets(series)
     sets = [{t for t in s if t not in JUNK} for s in raw_sets]
     nonempty = sum(1 for s in sets if len(s) > 0)
@@ -41,18 +73,22 @@ def run_field(name: str, series: pd.Series):
     # your version with fallback is perfect — keeping the same behavior
     def rec_knn(known, k=5):
         if not known:
+            POP_FALLBACK.inc(field=name, model="itemknn", reason="empty_known")
             return recommend_popularity(pop_list, known, k)
         out = recommend_itemknn(known, cooc, k)
         if not out:
+            POP_FALLBACK.inc(field=name, model="itemknn", reason="no_cooc")
             return recommend_popularity(pop_list, known, k)
         return out
 
     # PMI-based variant with the same fallback behavior
     def rec_pmi(known, k=5):
         if not known:
+            POP_FALLBACK.inc(field=name, model="pmi", reason="empty_known")
             return recommend_popularity(pop_list, known, k)
         out = recommend_itemknn_pmi(known, item_count, pair_count, k)
         if not out:
+            POP_FALLBACK.inc(field=name, model="pmi", reason="no_cooc")
             return recommend_popularity(pop_list, known, k)
         return out
 
@@ -65,12 +101,19 @@ def run_field(name: str, series: pd.Series):
     print(f"{'':8}    ItemKNN Recall@5: {r_knn:.3f} | MRR@5: {m_knn:.3f}  (n={n_knn})")
     print(f"{'':8}    PMI    Recall@5: {r_pmi:.3f} | MRR@5: {m_pmi:.3f}  (n={n_pmi})")
 
+    # 5-fold, every item held out once (leave-all-but-one); near-duplicates stay in one fold
+    for label, builder in [("Pop", build_pop_model), ("ItemKNN", build_knn_model), ("PMI", build_pmi_model)]:
+        m = kfold_eval(sets, builder, ks=KS, n_folds=5, protocol="all_but_one", groups=groups)
+        print(f"{'':8}    5-fold {label:7} {fmt_metrics(m)}")
+
 def main():
-    mech = load_mechanical(MECH)
+    mech = load_mechanical(MECH, columns=["feats", "weapons", "armor"])
+    groups = duplicate_clusters(mech)
     print("=== Baseline LOO @5 ===")
-    run_field("feats",   mech["feats"])
-    run_field("weapons", mech["weapons"])
-    run_field("armor",   mech["armor"])
+    run_field("feats",   mech["feats"], groups)
+    run_field("weapons", mech["weapons"], groups)
+    run_field("armor",   mech["armor"], groups)
+    metrics.dump(METRICS_OUT)
 
 if __name__ == "__main__":
     main()
@@ -1,27 +1,63 @@
 from pathlib import Path
-import random, numpy as np
+import random, time, numpy as np
 random.seed(42); np.random.seed(42)
 import pandas as pd
-from collections import Counter
+from collections import Counter, defaultdict
 
 from recs.vocab import load_mechanical, lists_to_sets
-from recs.baselines import topn_popularity, build_cooccurrence, recommend_popularity, recommend_itemknn
-from recs.evaluate import loo_eval_per_field, loo_eval_rowwise
-from recs.text import fit_tfidf, nearest_neighbors, neighbor_token_scores
-from recs.hybrid import blend_with_attribution
-from recs.legal import legality_penalties, apply_penalties, remove_duplicates
-from recs.tune import sample_simplex, save_weights, load_weights
+from recs.baselines import (
+    topn_popularity, build_cooccurrence, recommend_popularity, recommend_itemknn,
+    build_class_slices, class_slice_scores
+)
+from recs.evaluate import loo_eval_per_field, kfold_splits, recall_at_k, mrr_at_k
+from recs.text import (
+    nearest_neighbors, incidence_matrix, neighbor_weights, neighbor_weight_matrix, neighbor_item_scores, sparse_row_to_dict,
+    fit_field_tfidf, combine_fields, save_field_vectors, load_field_vectors
+)
+from recs.features import NARRATIVE_FIELDS
+from recs.dedup import duplicate_clusters, dedup_weights, representatives
+from recs.cache import open_cache, cache_lookup, cache_store, fingerprint, file_fingerprint
+from recs.explain import item_record, ExplanationWriter
+from recs import metrics
+from recs.hybrid import blend_topk_with_attribution, cooc_similarity, mmr_rerank, list_similarity, Budget, topk_indices
+from recs.canon import load_canon
+from recs.legal import RULES, compile_rules, row_penalties, apply_legality_batch
+from recs.class_eligibility import extract_ability_scores, ability_columns
+from recs.dataio import read_parquet, parquet_columns
+from recs.next_class import make_next_class_recommender, NEIGH_TOPN as NEXT_NEIGH_TOPN, SCORER_VERSION as NEXT_SCORER_VERSION
+from recs.tune import tune_weights, tune_scalar, save_weights, load_weights, save_trials
 WEIGHTS_FILE = Path("processed/hybrid_item_weights.json")
+SCORER_VERSION = 3     # part of every weights-file key; bump when a scorer changes so saved weights are re-tuned
 TUNE_TRIALS  = 120
+TUNE_BUDGET_S = 60.0   # wall-clock budget shared by all weight searches of one run
+MIN_CLASS_ROWS = 8     # primary classes with fewer non-empty rows share the field weights
 
 MECH = Path("processed/mechanical.parquet")
 NARR = Path("processed/narrative.parquet")
+ORIG = Path("processed/original_snapshot.parquet")
+CLONG = Path("processed/classes_long.parquet")
+CACHE = Path("processed/rec_cache.sqlite")
+CANON = Path("processed/canon_map.parquet")
+FIELD_VECTORS = Path("processed/narrative_fields")  # per-field tf-idf matrices, rebuilt when narrative.parquet changes
+METRICS_OUT = Path("processed/metrics.prom")
+POP_FALLBACK = metrics.counter("recs_popularity_fallback_total", "ItemKNN queries answered by the popularity fallback")
+QUERIES = metrics.counter("recs_queries_total", "Hybrid item queries scored")
 OUT  = Path("processed/recommendations.csv")
 
 # weights for blending (tweakable)
 W_ITEMKNN = 0.5
 W_NEIGH   = 0.4
 W_POP     = 0.1
+W_CLASS   = 0.2  # class-conditioned popularity/co-occurrence slice (not tuned)
+NEIGH_TOPN = 35
+DEDUP      = None           # near-duplicate handling: None, "downweight" or "collapse" (either mode changes every neighbor list)
+EXPLAIN_ROWS = None         # row ids to render explanations for (None = all rows)
+MMR_POOL   = 20             # candidates the diversity re-ranker chooses from
+DIVERSITY_GRID = (0.0, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5)
+DIVERSITY_GAIN = 0.05       # tuning objective: recall@5 + gain * (1 - mean pairwise item similarity)
+REQUEST_BUDGET_S = None     # per-character latency budget in the export pass (None = unbounded)
+KNOWN_CAP  = 12             # known items the itemknn pool is approximated from when short on time
+FIELD_TUNE_FOLDS = 3        # narrative field weights: tuned on all but one fold, reported on the held-out fold
 
 def weights_for(field):
     # default
@@ -33,121 +69,282 @@ def weights_for(field):
 
 
 
+def load_saved_weights() -> dict:
+    """Saved weights of the current SCORER_VERSION; entries of other versions are dropped on the next save."""
+    prefix = f"v{SCORER_VERSION}::"
+    return {k: v for k, v in load_weights(WEIGHTS_FILE, {}).items() if k.startswith(prefix)}
+
 def make_sets(series: pd.Series):
     raw = lists_to_sets(series)
     JUNK = {"", "none", "n_a", "na", "n", "weapon", "armor", "unarmed"}
     return [{t for t in s if t not in JUNK} for s in raw]
 
-def eval_field(name: str, mech: pd.DataFrame, X, narr_df: pd.DataFrame):
+def eval_field(name: str, mech: pd.DataFrame, X, narr_df: pd.DataFrame, abilities: list[dict] | None = None, clusters=None,
+               tune_deadline: float | None = None):
+    # tune_deadline: absolute time.perf_counter() value shared with the other tuning passes of the run
+    if tune_deadline is None:
+        tune_deadline = time.perf_counter() + TUNE_BUDGET_S
     series = mech[name]
     sets   = make_sets(series)
     global_counts = Counter()
     for s in sets:
         global_counts.update(s)
     global_vocab = set(global_counts.keys())
+    # class-conditioned priors: one popularity vector + cooc slice per primary class / subclass
+    prim_cls = [str(c) if pd.notna(c) else None for c in mech["primary_class"]]
+    prim_sub = [str(c) if pd.notna(c) else None for c in mech["primary_subclass"]]
+    slices   = build_class_slices(sets, prim_cls, prim_sub)
+    # legality rules compiled once into sparse (class x item) / (row x item) penalties
+    legal    = compile_rules(name, sorted({c for c in prim_cls if c}), sorted(global_vocab), ability_rows=abilities,
+                             canon=load_canon(CANON).get(name) if CANON.exists() else None)
     # train/test split for baselines
     idxs = list(range(len(sets)))
-    random.seed(42)
-    random.shuffle(idxs)
+    random.Random(42).shuffle(idxs)
     split = int(0.8 * len(idxs))
     train_ids, test_ids = idxs[:split], idxs[split:]
+    row_weights = None
+    if clusters is not None and DEDUP == "collapse":
+        keep = set(representatives(clusters))
+        train_ids = [i for i in train_ids if i in keep]
+        test_ids  = [i for i in test_ids if i in keep]
+    elif clusters is not None and DEDUP == "downweight":
+        row_weights = dedup_weights(clusters)[train_ids].tolist()
     train_sets = [sets[i] for i in train_ids]
     test_sets  = [sets[i] for i in test_ids]
 
     # popularity + cooc
     pop_list = topn_popularity(train_sets, n=300)
-    cooc     = build_cooccurrence(train_sets)
-
-    def tune_weights_for_field():
-        best = (-1.0, (0.5, 0.4, 0.1))  # (recall, weights)
-        # sample candidates (mix deterministic grid + random dirichlet)
-        cand = sample_simplex(n=3, num=TUNE_TRIALS, kind="dirichlet") + sample_simplex(n=3, num=0, kind="grid")
-        for w in cand:
-            rec_hyb = make_rec_hybrid_for_row(w)
-            def wrapper(rid: int, known: set, k=5):
-                items, _ = rec_hyb(rid, k=k, _known_override=known)
-                return items
-            r_hyb, m_hyb, n_hyb = loo_eval_rowwise(sets, wrapper, k=5)
-            if r_hyb > best[0]:
-                best = (r_hyb, w)
-        return best  # (best_recall, (w_i, w_n, w_p))
+    cooc     = build_cooccurrence(train_sets, weights=row_weights)
+
+    # batch leave-one-out scorer (weight search + reported eval): one fixed held-out item per row,
+    # the component scores are computed once per row and every candidate only re-weights them
+    loo_rng = random.Random(42)
+    loo_targets = {rid: loo_rng.choice(sorted(s)) for rid, s in enumerate(sets) if s}
+    loo_parts: dict[int, tuple] = {}
+
+    def loo_components(row_ids):
+        """(4 x B x V) component scores in legal["vocab"] order (NaN = not a candidate), (B x V) owned mask."""
+        V, item = len(legal["vocab"]), legal["items"]
+        todo = [r for r in row_ids if r not in loo_parts]
+        if todo:
+            cols = np.array([item[t] for t in inc_vocab])
+            neigh = neighbor_item_scores(neighbor_weight_matrix(X, todo, topn=NEIGH_TOPN, groups=clusters), incidence).toarray()
+            for b, rid in enumerate(todo):
+                known = {str(t) for t in sets[rid] - {loo_targets[rid]}}
+                P = np.full((4, V), np.nan)
+                for p, scores in ((0, {str(it): 1.0 for it in rec_itemknn(known, k=80)} if known else {}),
+                                  (2, pop_prior),
+                                  (3, class_slice_scores(slices, prim_cls[rid], prim_sub[rid], known, own=sets[rid]))):
+                    if scores:
+                        P[p, [item[t] for t in scores]] = list(scores.values())
+                hit = neigh[b] > 0
+                P[1, cols[hit]] = neigh[b][hit]
+                owned = np.zeros(V, dtype=bool)
+                owned[[item[t] for t in known]] = True
+                loo_parts[rid] = (P, owned)
+        P, owned = zip(*(loo_parts[r] for r in row_ids))
+        return np.stack(P, axis=1), np.stack(owned)
+
+    def loo_topk(rows, weights, diversity=0.0, k=5):
+        """Top-k lists for the held-out queries of rows; weights: one (w_i, w_n, w_p) or one per row."""
+        P, owned = loo_components(rows)
+        w = np.broadcast_to(np.asarray(weights, dtype=float), (len(rows), 3))
+        S = np.einsum("bp,pbv->bv", np.column_stack([w, np.full(len(rows), W_CLASS)]), np.nan_to_num(P))
+        S = apply_legality_batch(legal, S, [prim_cls[r] for r in rows], owned=owned, row_ids=rows)
+        S[np.isnan(P).all(axis=0) | owned] = np.nan
+        pool = max(k, MMR_POOL) if diversity > 0 else k
+        out = []
+        for b in range(len(rows)):
+            top = [(legal["vocab"][j], float(S[b, j])) for j in topk_indices(S[b], pool)]
+            if diversity > 0:
+                top = mmr_rerank(top, k, item_sim, inc_index, diversity)
+            out.append([it for it, _ in top])
+        return out
+
+    def loo_metrics(rows, lists, k=5):
+        """(recall@k, mrr@k, n) of loo_topk lists against the held-out items."""
+        if not rows:
+            return 0.0, 0.0, 0
+        r = [recall_at_k(loo_targets[rid], items, k) for rid, items in zip(rows, lists)]
+        m = [mrr_at_k(loo_targets[rid], items, k) for rid, items in zip(rows, lists)]
+        return float(np.mean(r)), float(np.mean(m)), len(rows)
+
+    def eval_weights(w, row_ids):
+        rows = [r for r in row_ids if r in loo_targets]
+        return loo_metrics(rows, loo_topk(rows, w) if rows else [])[0]
+
+    def tune_weights_for_rows(row_ids, history, tag):
+        start = len(history)
+        best = tune_weights(eval_weights, row_ids, n=3, num=TUNE_TRIALS,
+                            deadline=tune_deadline, history=history)
+        for h in history[start:]:
+            h["key"] = tag
+        return best  # (best_recall, (w_i, w_n, w_p)); recall -1 when the budget ran out first
 
 
     def rec_pop(known, k=5): 
         return recommend_popularity(pop_list, known, k)
 
-    def rec_itemknn(known, k=5):
+    def rec_itemknn(known, k=5, count=False):
+        # count: record fallbacks in POP_FALLBACK - only the serving path (_rec) does, so the
+        # counter stays comparable with QUERIES; tuning and evaluation calls are not counted
         if not known:
+            if count:
+                POP_FALLBACK.inc(field=name, reason="empty_known")
             return recommend_popularity(pop_list, known, k)
         out = recommend_itemknn(known, cooc, k)
+        if not out and count:
+            POP_FALLBACK.inc(field=name, reason="no_cooc")
         return out or recommend_popularity(pop_list, known, k)
 
     # Hybrid recommender: itemknn + narrative neighbors + popularity (+ legality)
-    token_series = series  # feats/weapons/armor lists per row
-
-    def make_rec_hybrid_for_row(weights_tuple):
-        # unpack & freeze the weights
+    incidence, inc_vocab = incidence_matrix(sets)  # (rows x items), neighbor votes are one sparse product
+    # item-item cosine over the training co-occurrences, for the MMR diversity re-ranker
+    item_sim   = cooc_similarity(incidence[train_ids], row_weights)
+    inc_index  = {t: j for j, t in enumerate(inc_vocab)}
+    maxc = max(global_counts.values()) if global_counts else 1
+    pop_prior = {str(it): global_counts[it] / maxc for it in global_vocab}
+    component_costs = {}  # running-average seconds per scorer component (for deadlines)
+
+    def popularity_fallback(known, k, pen_map, primary):
+        # out of time: most popular unseen items, legality-penalized ones last
+        cand = recommend_popularity(pop_list, known, k + len(pen_map))
+        items = sorted(cand, key=lambda it: pen_map.get(it, 0.0) < 0)[:k]
+        scores = [pop_prior.get(it, 0.0) + pen_map.get(it, 0.0) for it in items]
+        contrib = [[0.0, 0.0, pop_prior.get(it, 0.0), 0.0] for it in items]
+        rec = item_record(items, scores, contrib, [pen_map.get(it, 0.0) for it in items], primary,
+                          components=["popularity_fallback"])
+        return items, rec
+
+    def make_rec_hybrid_for_row(weights_tuple, class_weights=None, diversity=0.0):
+        # unpack & freeze the weights; class_weights: primary_class -> weights override
         w_i, w_n, w_p = map(float, weights_tuple)
+        diversity = float(diversity)
+        class_weights = {c: tuple(map(float, w)) for c, w in (class_weights or {}).items()}
 
-        def _rec(row_id: int, k=5, _known_override=None, _w_i=w_i, _w_n=w_n, _w_p=w_p):
+        def _rec(row_id: int, k=5, _known_override=None, _neigh=None, deadline=None, _w_i=w_i, _w_n=w_n, _w_p=w_p):
+            # deadline: absolute time.perf_counter() value; components run cheapest first and
+            # are skipped/approximated once it can't be met (None = no limit)
+            primary = str(mech.loc[row_id, "primary_class"]) if pd.notna(mech.loc[row_id, "primary_class"]) else None
+            if primary in class_weights:
+                _w_i, _w_n, _w_p = class_weights[primary]
             known = sets[row_id] if _known_override is None else _known_override
             known = {str(x) for x in known}
-
-            # 1) itemknn pool
-            itemknn_scores = Counter()
-            if known:
-                for it in rec_itemknn(known, k=80):
-                    itemknn_scores[str(it)] += 1.0
-
-            # 2) narrative neighbors
-            neigh = nearest_neighbors(X, row_id, topn=35)
-            neigh_scores = neighbor_token_scores(neigh, token_series, exclude=known)
-            neigh_scores = {str(t): float(w) for t, w in neigh_scores.items()}
-
-            # 3) global prior over ALL tokens
-            maxc = max(global_counts.values()) if global_counts else 1
-            pop_scores = {str(it): global_counts[it] / maxc for it in global_vocab}
-
-            # blend with attribution (use captured weights)
-            parts = [itemknn_scores, neigh_scores, pop_scores]
-            blended, contribs = blend_with_attribution(parts, [_w_i, _w_n, _w_p])
-
-            # legality
-            primary = str(mech.loc[row_id, "primary_class"]) if pd.notna(mech.loc[row_id, "primary_class"]) else None
-            blended = remove_duplicates(blended, owned=known)
-            pen_map = {} if name == "feats" else legality_penalties(primary, list(blended.keys()))
-            blended = apply_penalties(blended, pen_map)
-
-            ranked = sorted(blended.items(), key=lambda x: x[1], reverse=True)
-            topk = ranked[:k]
-
-            details = []
-            for item, score in topk:
-                c = contribs.get(item, {})
-                details.append({
-                    "item": item,
-                    "score": float(score),
-                    "from_itemknn": float(c.get("part_0", 0.0)),
-                    "from_narrative": float(c.get("part_1", 0.0)),
-                    "from_pop": float(c.get("part_2", 0.0)),
-                    "penalty": float(pen_map.get(item, 0.0)),
-                    "primary_class": primary
-                })
-            return [it for it, _ in topk], details
+            QUERIES.inc(field=name)
+            budget = Budget(deadline, component_costs)
+
+            # legality penalties are always applied (one sparse row lookup)
+            pen_map = row_penalties(legal, primary, row_id)
+            if budget.expired():
+                return popularity_fallback(known, k, pen_map, primary)
+
+            # 1) class-conditioned slice (O(1) lookup of the row's class/subclass)
+            class_scores = budget.run("class", lambda: class_slice_scores(slices, primary, prim_sub[row_id], known, own=sets[row_id]), default={})
+
+            # 2) global prior over ALL tokens (precomputed)
+            pop_scores = budget.run("pop", lambda: pop_prior, default={})
+
+            # 3) itemknn pool; cost grows with the known set, so the fallback scores only its most popular items
+            def itemknn(ks):
+                out = Counter()
+                if ks:
+                    for it in rec_itemknn(ks, k=80, count=True):
+                        out[str(it)] += 1.0
+                return out
+            capped = lambda: itemknn(set(sorted(known, key=lambda t: -global_counts.get(t, 0))[:KNOWN_CAP]))
+            itemknn_scores = budget.run("itemknn", lambda: itemknn(known),
+                                        fallback=capped if len(known) > KNOWN_CAP else None, default={})
+
+            # 4) narrative neighbors (reuse a precomputed neighborhood when given) - the expensive part
+            if _neigh is None:
+                neigh = budget.run("neighbors", lambda: nearest_neighbors(X, row_id, topn=NEIGH_TOPN, groups=clusters))
+            else:
+                neigh = _neigh[:NEIGH_TOPN]
+            neigh_scores = {}
+            if neigh:  # None / [] = neighbor search skipped for this request
+                W = neighbor_weights(neigh, incidence.shape[0])
+                neigh_scores = budget.run("narrative", lambda: sparse_row_to_dict(neighbor_item_scores(W, incidence), inc_vocab, exclude=known), default={})
+
+            # streaming top-k blend with attribution (skipped components contribute nothing)
+            parts = [itemknn_scores, neigh_scores, pop_scores, class_scores]
+            pool = max(k, MMR_POOL) if diversity > 0 else k
+            # ties break in legal["vocab"] order, as in the batch leave-one-out scorer (loo_topk)
+            topk, contribs = blend_topk_with_attribution(parts, [_w_i, _w_n, _w_p, W_CLASS], pool,
+                                                         exclude=known, penalties=pen_map, key_order=legal["items"])
+            if not topk:
+                return popularity_fallback(known, k, pen_map, primary)
+            # diversity re-rank of the (already penalized) pool
+            if diversity > 0:
+                topk = budget.run("mmr", lambda: mmr_rerank(topk, k, item_sim, inc_index, diversity), default=topk[:k])
+
+            # compact numeric explanation; rendered to rows later (recs.explain)
+            items = [it for it, _ in topk]
+            contrib = [[contribs[it].get(f"part_{i}", 0.0) for i in range(4)] for it in items]
+            rec = item_record(items, [sc for _, sc in topk], contrib, [pen_map.get(it, 0.0) for it in items], primary,
+                              components=budget.used)
+            return items, rec
 
         return _rec
 
 
-    saved = load_weights(WEIGHTS_FILE, {})
-    field_key = f"item::{name}"
+    saved = load_saved_weights()
+    field_key = f"v{SCORER_VERSION}::item::{name}"
+    class_key = f"{field_key}::by_class"
+    history = []
+    all_rows = [i for i, s in enumerate(sets) if s]
+    if clusters is not None and DEDUP == "collapse":
+        all_rows = [i for i in representatives(clusters) if sets[i]]
     if field_key in saved:
         best_w = tuple(saved[field_key])
     else:
-        best_score, best_w = tune_weights_for_field()
-        saved[field_key] = list(best_w)
+        best_score, best_w = tune_weights_for_rows(all_rows, history, field_key)
+        if best_score < 0:  # out of tuning budget: defaults now, tuned on a later run
+            best_w = weights_for(name)
+        else:
+            saved[field_key] = list(best_w)
+    if class_key in saved:
+        class_w = {c: tuple(w) for c, w in saved[class_key].items()}
+    else:
+        # per-primary-class weight sets where there is enough data to tune them
+        class_w = {}
+        by_class = defaultdict(list)
+        for rid in all_rows:
+            if prim_cls[rid] is not None:  # classless rows use the field weights
+                by_class[prim_cls[rid]].append(rid)
+        complete = True
+        for cls, rids in by_class.items():
+            if len(rids) < MIN_CLASS_ROWS:
+                continue
+            score, w = tune_weights_for_rows(rids, history, f"{field_key}::{cls}")
+            if score < 0:
+                complete = False
+            elif w is not None:
+                class_w[cls] = w
+        if complete:
+            saved[class_key] = {c: list(w) for c, w in class_w.items()}
+    div_key = f"{field_key}::diversity"
+    if div_key in saved:
+        diversity = float(saved[div_key])
+    else:
+        def eval_diversity(d, row_ids):
+            rows = [r for r in row_ids if r in loo_targets]
+            lists = loo_topk(rows, [class_w.get(prim_cls[r], best_w) for r in rows], diversity=d[0]) if rows else []
+            sims = [list_similarity(items, item_sim, inc_index) for items in lists]
+            r, _, _ = loo_metrics(rows, lists)
+            return r + DIVERSITY_GAIN * (1.0 - float(np.mean(sims) if sims else 0.0))
+        start = len(history)
+        div_score, diversity = tune_scalar(eval_diversity, all_rows, DIVERSITY_GRID,
+                                           deadline=tune_deadline, history=history)
+        for h in history[start:]:
+            h["key"] = div_key
+        diversity = diversity or 0.0
+        if div_score >= 0:
+            saved[div_key] = diversity
+    if history:
         save_weights(WEIGHTS_FILE, saved)
+        save_trials(Path(f"processed/tune_trials_{name}.json"), history)
 
-    rec_hybrid_for_row = make_rec_hybrid_for_row(best_w)
+    rec_hybrid_for_row = make_rec_hybrid_for_row(best_w, class_w, diversity)
 
     # Evaluate baselines + hybrid (row-aware)
     print(f"[{name}] rows={len(sets)} nonempty={sum(1 for s in sets if s)} avg_len={sum(len(s) for s in sets)/max(1,len(sets)):.2f}")
@@ -156,44 +353,93 @@ def eval_field(name: str, mech: pd.DataFrame, X, narr_df: pd.DataFrame):
     print(f"{name:8} -> Pop     R@5:{r_pop:.3f} MRR@5:{m_pop:.3f} (n={n_pop})")
     print(f"{'':8}    ItemKNN R@5:{r_knn:.3f} MRR@5:{m_knn:.3f} (n={n_knn})")
 
-    # Row-aware hybrid eval: when we hide the target, we must pass that reduced known set
-    def rec_hybrid_rowaware(rid: int, known: set, k=5):
-        items, _ = rec_hybrid_for_row(rid, k=k, _known_override=known)
-        return items
-    r_hyb, m_hyb, n_hyb = loo_eval_rowwise(sets, rec_hybrid_rowaware, k=5)
-    print(f"{'':8}    Hybrid* R@5:{r_hyb:.3f} MRR@5:{m_hyb:.3f} (n={n_hyb})  w={tuple(round(x,2) for x in best_w)}")
+    # Row-aware hybrid eval: the batch leave-one-out scorer with the final (per-class) weights and diversity
+    rows = [r for r in all_rows if r in loo_targets]
+    lists = loo_topk(rows, [class_w.get(prim_cls[r], best_w) for r in rows], diversity=diversity)
+    r_hyb, m_hyb, n_hyb = loo_metrics(rows, lists)
+    print(f"{'':8}    Hybrid* R@5:{r_hyb:.3f} MRR@5:{m_hyb:.3f} (n={n_hyb})  w={tuple(round(x,2) for x in best_w)} diversity={diversity:g}")
 
     return rec_hybrid_for_row
 
-def export_character_recs(mech: pd.DataFrame, rec_fns: dict[str, callable], k=5):
-    rows, expl = [], []
-    for rid in range(len(mech)):
-        row = {
-            "row_id": rid,
-            "primary_class": mech.loc[rid, "primary_class"],
-            "primary_subclass": mech.loc[rid, "primary_subclass"],
-        }
-        for field, fn in rec_fns.items():
-            ret = fn(rid, k=k)
-            # Accept list, (items,), (items, details), or longer tuples
-            if isinstance(ret, tuple):
-                items = ret[0]
-                details = ret[1] if len(ret) > 1 else []
-            else:
-                items = ret
-                details = []
-            # Normalize items to list
-            if not isinstance(items, list):
-                items = list(items) if items is not None else []
-            row[f"top_{field}"] = items
-            # Collect details if present
-            if isinstance(details, list):
-                for d in details:
-                    if isinstance(d, dict):
-                        d = dict(d)  # shallow copy
-                        d.update({"row_id": rid, "field": field})
-                        expl.append(d)
-        rows.append(row)
+def export_character_recs(mech: pd.DataFrame, rec_fns: dict[str, callable], k=5, X=None, next_fn=None, clusters=None,
+                          cache=None, model_version: str = "", input_keys: dict[int, str] | None = None,
+                          explain_rows: set[int] | None = None):
+    """
+    Joint pass: one narrative neighborhood per character, fanned out to every
+    field scorer (and the next-class scorer, if given) -> one record per character.
+    cache: open recs.cache connection; rows whose input fingerprint (input_keys)
+    and model_version are unchanged are reused instead of recomputed. Bypassed when
+    REQUEST_BUDGET_S is set: results then depend on timing (skipped components,
+    popularity fallbacks) and must not be served on later runs.
+    explain_rows: render explanations only for these rows (None = all); rendering
+    runs on a background ExplanationWriter while scoring continues.
+    """
+    rows = []
+    neigh_costs = {}  # running cost of the shared neighbor search (deadline budgeting)
+    use_cache = cache is not None and bool(input_keys) and REQUEST_BUDGET_S is None
+    hits = cache_lookup(cache, "character", input_keys, model_version) if use_cache else {}
+    cached_expl = {}
+    pending: dict[int, list] = {}
+    with ExplanationWriter() as writer:
+        for rid in range(len(mech)):
+            if rid in hits:
+                rows.append(hits[rid]["row"])
+                cached_expl[rid] = hits[rid]["expl"]
+                continue
+            row = {
+                "row_id": rid,
+                "primary_class": mech.loc[rid, "primary_class"],
+                "primary_subclass": mech.loc[rid, "primary_subclass"],
+            }
+            # the request deadline covers the shared neighbor search too; when it is skipped every
+            # scorer gets an empty neighborhood instead of searching on its own
+            deadline = time.perf_counter() + REQUEST_BUDGET_S if REQUEST_BUDGET_S is not None else None
+            neigh = None
+            if X is not None:
+                neigh = Budget(deadline, neigh_costs).run(
+                    "neighbors", lambda: nearest_neighbors(X, rid, topn=max(NEIGH_TOPN, NEXT_NEIGH_TOPN), groups=clusters), default=[])
+            fns = dict(rec_fns)
+            if next_fn is not None:
+                fns["next_classes"] = next_fn
+            pending[rid] = []
+            for field, fn in fns.items():
+                ret = fn(rid, k=k, _neigh=neigh, deadline=deadline) if neigh is not None else fn(rid, k=k, deadline=deadline)
+                # Accept list, (items,), (items, details), or longer tuples
+                if isinstance(ret, tuple):
+                    items = ret[0]
+                    details = ret[1] if len(ret) > 1 else []
+                else:
+                    items = ret
+                    details = []
+                # Normalize items to list
+                if not isinstance(items, list):
+                    items = list(items) if items is not None else []
+                row[f"top_{field}"] = items
+                if explain_rows is not None and rid not in explain_rows:
+                    continue
+                # compact records render in the background; plain detail dicts pass through.
+                # Which components ran is only reported when a latency budget is set.
+                if isinstance(details, dict) and deadline is None and details.get("components") is not None:
+                    details = dict(details, components=None)
+                if isinstance(details, dict) and "kind" in details:
+                    pending[rid].append(writer.submit(rid, details, row_id=rid, field=field))
+                elif isinstance(details, list):
+                    pending[rid].append([dict(d, row_id=rid, field=field) for d in details if isinstance(d, dict)])
+            rows.append(row)
+
+        expl_by_row = dict(cached_expl)
+        for rid, parts in pending.items():
+            expl_by_row[rid] = [d for p in parts for d in (p.result() if hasattr(p, "result") else p)]
+
+    if use_cache:
+        fresh = [(rid, input_keys[rid], {"row": rows[rid], "expl": expl_by_row[rid]})
+                 for rid in pending if explain_rows is None or rid in explain_rows]
+        if fresh:
+            cache_store(cache, "character", model_version, fresh)
+        print(f"cache: reused {len(hits)} / recomputed {len(pending)} characters")
+    elif cache is not None:
+        print("cache: bypassed (REQUEST_BUDGET_S is set)")
+    expl = [d for rid in range(len(mech)) for d in expl_by_row.get(rid, [])]
     out = pd.DataFrame(rows)
     OUT.parent.mkdir(parents=True, exist_ok=True)
     out.to_csv(OUT, index=False)
@@ -207,20 +453,136 @@ def export_character_recs(mech: pd.DataFrame, rec_fns: dict[str, callable], k=5)
         print(f"\nSaved per-character recommendations -> {OUT}")
 
 
+def character_keys(mech: pd.DataFrame, narr: pd.DataFrame, original: pd.DataFrame | None, cl: pd.DataFrame | None) -> dict[int, str]:
+    """Fingerprint of the character's own input rows (mechanical, narrative, abilities, classes)."""
+    bags = cl.groupby("row_id")["class"].apply(sorted).to_dict() if cl is not None else {}
+    text_cols = ["narrative_text"] + [f for f in NARRATIVE_FIELDS if f in narr.columns]
+    keys = {}
+    for rid in range(len(mech)):
+        m = mech.iloc[rid]
+        keys[rid] = fingerprint(
+            [m[c] for c in ["primary_class", "primary_subclass", "feats", "weapons", "armor"]],
+            [narr[c].iloc[rid] for c in text_cols],
+            extract_ability_scores(original.iloc[rid]) if original is not None else None,
+            bags.get(rid, []),
+        )
+    return keys
+
+def narrative_field_vectors(narr: pd.DataFrame, fit_rows: list[int] | None):
+    """Per-field tf-idf matrices from the on-disk cache; tokenized only when the narratives change."""
+    key = fingerprint(file_fingerprint(NARR), fit_rows, NARRATIVE_FIELDS)
+    mats = load_field_vectors(FIELD_VECTORS, key)
+    if mats is None:
+        mats = fit_field_tfidf(narr, NARRATIVE_FIELDS, fit_rows=fit_rows)
+        save_field_vectors(FIELD_VECTORS, mats, key)
+    return mats
+
+def tune_field_weights(mats: dict, mech: pd.DataFrame, fields=("feats", "weapons", "armor"), deadline: float | None = None,
+                       clusters=None):
+    """
+    Narrative field weights (backstory vs flaws, ...) tuned with recs.tune on the
+    narrative component alone: leave-one-out recall@5 of neighbor item votes,
+    averaged over the item fields. Each candidate is only a weighted sparse sum.
+    Neighbors skip the query's duplicate cluster (as the hybrid scorer does); the
+    search runs on FIELD_TUNE_FOLDS-1 folds and is reported on the held-out one.
+    """
+    names = list(mats)
+    field_sets = [make_sets(mech[f]) for f in fields]
+    incid = [incidence_matrix(sets) for sets in field_sets]
+    rng = random.Random(42)
+    # one held-out item per (field, row); the rest stays "owned" and is masked out
+    targets = [{rid: rng.choice(sorted(s)) for rid, s in enumerate(sets) if s} for sets in field_sets]
+
+    def eval_fn(w, row_ids):
+        X = combine_fields(mats, dict(zip(names, w)))
+        W = neighbor_weight_matrix(X, row_ids, topn=NEIGH_TOPN, groups=clusters)
+        hits, n = 0, 0
+        for (M, vocab), tgt in zip(incid, targets):
+            index = {t: j for j, t in enumerate(vocab)}
+            owned = M[row_ids].tolil()
+            for b, rid in enumerate(row_ids):
+                if rid in tgt:
+                    owned[b, index[tgt[rid]]] = 0
+            S = neighbor_item_scores(W, M, owned=owned.tocsr()).toarray()
+            for b, rid in enumerate(row_ids):
+                if rid not in tgt:
+                    continue
+                row = np.where(S[b] > 0, S[b], np.nan)
+                hits += index[tgt[rid]] in topk_indices(row, 5)
+                n += 1
+        return hits / max(1, n)
+
+    tune_rows, report_rows = kfold_splits(len(mech), n_folds=FIELD_TUNE_FOLDS, groups=clusters)[0]
+    history = []
+    best_score, best_w = tune_weights(eval_fn, tune_rows, n=len(names), num=TUNE_TRIALS,
+                                      time_budget=TUNE_BUDGET_S, deadline=deadline, history=history)
+    for h in history:
+        h["key"] = f"v{SCORER_VERSION}::narrative::fields"
+    save_trials(Path("processed/tune_trials_narrative.json"), history)
+    if best_score < 0:
+        return None  # out of tuning budget
+    tuned = eval_fn(best_w, report_rows)
+    equal = eval_fn([1.0 / len(names)] * len(names), report_rows)
+    print(f"[narrative] field weights held-out R@5:{tuned:.3f} (equal weights {equal:.3f}, tuning rows {best_score:.3f})  "
+          + " ".join(f"{f}={w:.2f}" for f, w in zip(names, best_w)))
+    return dict(zip(names, best_w))
+
+def narrative_space(mech: pd.DataFrame, narr: pd.DataFrame, tune_deadline: float | None = None):
+    """
+    (X, clusters, field weights): the narrative space every scorer searches neighbors in,
+    shared with scripts/recommend_next_class_hybrid.py. Field weights missing from the
+    weights file are tuned when tune_deadline is given, equal weights are used otherwise.
+    """
+    # near-duplicate clusters (MinHash/LSH over item sets + narrative shingles)
+    clusters = duplicate_clusters(mech, narr) if DEDUP else None
+    # narrative vectors: cached per-field tf-idf, combined with tuned field weights
+    mats = narrative_field_vectors(narr, representatives(clusters) if clusters is not None else None)
+    saved = load_saved_weights()
+    narr_key = f"v{SCORER_VERSION}::narrative::fields"
+    if narr_key not in saved and tune_deadline is not None:
+        tuned = tune_field_weights(mats, mech, deadline=tune_deadline, clusters=clusters)
+        if tuned is not None:
+            saved[narr_key] = tuned
+            save_weights(WEIGHTS_FILE, saved)
+    field_w = saved.get(narr_key, {f: 1.0 / len(mats) for f in mats})
+    return combine_fields(mats, field_w), clusters, field_w
+
 def main():
     mech = load_mechanical(MECH)
-    narr = pd.read_parquet(NARR)
-    _, X  = fit_tfidf(narr)
-
-    rec_feat   = eval_field("feats",   mech, X, narr)
-    rec_weapon = eval_field("weapons", mech, X, narr)
-    rec_armor  = eval_field("armor",   mech, X, narr)
+    narr = read_parquet(NARR, columns=["row_id", "narrative_text"] + NARRATIVE_FIELDS)
+    tune_deadline = time.perf_counter() + TUNE_BUDGET_S  # one budget for every weight search below
+    X, clusters, _ = narrative_space(mech, narr, tune_deadline)
+    abilities, original = None, None
+    if ORIG.exists():
+        original  = read_parquet(ORIG, columns=ability_columns(parquet_columns(ORIG)))
+        abilities = [extract_ability_scores(r) for _, r in original.iterrows()]
+
+    rec_feat   = eval_field("feats",   mech, X, narr, abilities, clusters, tune_deadline)
+    rec_weapon = eval_field("weapons", mech, X, narr, abilities, clusters, tune_deadline)
+    rec_armor  = eval_field("armor",   mech, X, narr, abilities, clusters, tune_deadline)
+
+    cl = read_parquet(CLONG, columns=["row_id", "class"]) if CLONG.exists() else None
+    rec_next = make_next_class_recommender(mech, cl, X, original, groups=clusters) if cl is not None else None
+
+    # result cache: an entry is keyed by the character's own rows; the model version covers the scorer
+    # code versions, rules, tuned weights, settings and every character's rows - the fitted statistics
+    # (co-occurrence, popularity, class slices, class co-occurrence, tf-idf corpus) are built from all
+    # of them, so any input edit recomputes every character and unchanged inputs reuse everything.
+    k = 5
+    input_keys = character_keys(mech, narr, original, cl)
+    model_version = fingerprint(SCORER_VERSION, NEXT_SCORER_VERSION, load_saved_weights(), k,
+                                W_CLASS, NEIGH_TOPN, NEXT_NEIGH_TOPN, DEDUP, KNOWN_CAP, MMR_POOL, REQUEST_BUDGET_S,
+                                RULES, file_fingerprint(CANON), input_keys)
 
     export_character_recs(mech, {
         "feats": rec_feat,
         "weapons": rec_weapon,
         "armor": rec_armor,
-    }, k=5)
+    }, k=k, X=X, next_fn=rec_next, clusters=clusters,
+       cache=open_cache(CACHE), model_version=model_version, input_keys=input_keys,
+       explain_rows=EXPLAIN_ROWS)
+    metrics.dump(METRICS_OUT)
+    print(f"Saved metrics -> {METRICS_OUT}")
 
 if __name__ == "__main__":
     main()
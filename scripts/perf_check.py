@@ -0,0 +1,211 @@
+"""
+Performance regression check for the hot paths (nearest_neighbors,
+recommend_itemknn, normalize) on bundled and synthetic data.
+
+    python scripts/perf_check.py            # compare against scripts/perf_baselines.json
+    python scripts/perf_check.py --update   # re-record the baselines
+
+Each case measures time per call (best of several auto-ranged rounds) and peak
+traced allocation per call. Times are normalized by a fixed calibration workload
+so baselines recorded on another machine stay comparable. Exits 1 when a case
+is slower or allocates more than the baseline by more than the tolerance.
+"""
+import argparse, json, platform, sys, time, tracemalloc
+from pathlib import Path
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize as l2_normalize
+
+from recs.dataio import read_characters_xlsx, read_parquet
+from recs.features import normalize
+from recs.text import fit_tfidf, nearest_neighbors
+from recs.baselines import build_cooccurrence, recommend_itemknn
+from recs.vocab import lists_to_sets
+
+BASELINES = Path(__file__).with_name("perf_baselines.json")
+RAW_XLSX  = Path("data/raw/characters.xlsx")
+NARR      = Path("processed/narrative.parquet")
+MECH      = Path("processed/mechanical.parquet")
+TOLERANCE = 1.0       # allowed slowdown / extra allocation (1.0 = 2x baseline)
+MIN_ROUND_S = 0.05
+ROUNDS    = 7
+PASSES    = 3         # --update keeps the best of several passes; a failing case is re-measured once
+
+CASES = {}
+
+def case(name):
+    """Register a fixture: a setup function returning the zero-argument call to measure."""
+    def deco(setup):
+        CASES[name] = setup
+        return setup
+    return deco
+
+def _synthetic_sets(n_rows=20_000, vocab=2_000, seed=42):
+    rng = np.random.default_rng(seed)
+    lens = rng.integers(0, 8, size=n_rows)
+    ranks = rng.zipf(1.3, size=int(lens.sum())) % vocab
+    return [set(f"item_{i}" for i in r) for r in np.split(ranks, np.cumsum(lens)[:-1])]
+
+@case("nearest_neighbors/bundled")
+def _nn_bundled():
+    _, X = fit_tfidf(read_parquet(NARR, columns=["row_id", "narrative_text"]))
+    return lambda: nearest_neighbors(X, 0, topn=35)
+
+@case("nearest_neighbors/synthetic_20k")
+def _nn_synthetic():
+    X = l2_normalize(sparse.random(20_000, 5_000, density=0.002, format="csr", random_state=42))
+    return lambda: nearest_neighbors(X, 0, topn=35)
+
+@case("recommend_itemknn/bundled")
+def _knn_bundled():
+    sets = [{str(t) for t in s} for s in lists_to_sets(read_parquet(MECH, columns=["weapons"])["weapons"])]
+    cooc = build_cooccurrence(sets)
+    known = max(sets, key=len)
+    return lambda: recommend_itemknn(known, cooc, k=80)
+
+@case("recommend_itemknn/synthetic_20k")
+def _knn_synthetic():
+    sets = _synthetic_sets()
+    cooc = build_cooccurrence(sets)
+    known = {f"item_{i}" for i in (1, 2, 3, 5, 8)}
+    return lambda: recommend_itemknn(known, cooc, k=80)
+
+@case("normalize/bundled")
+def _normalize_bundled():
+    df = read_characters_xlsx(RAW_XLSX)
+    return lambda: normalize(df)
+
+@case("normalize/bundled_x20")
+def _normalize_scaled():
+    import pandas as pd
+    df = read_characters_xlsx(RAW_XLSX)
+    return lambda: normalize(pd.concat([df] * 20, ignore_index=True))
+
+def _calibration():
+    # fixed mixed python/numpy workload used to normalize times across machines
+    rng = np.random.default_rng(0)
+    a = rng.random(200_000)
+    def work():
+        np.sort(a)
+        d = {}
+        for i in range(50_000):
+            d[i % 997] = d.get(i % 997, 0) + i
+        return d
+    return work
+
+def time_per_call(fn) -> float:
+    fn()  # warm-up
+    n = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(n):
+            fn()
+        if time.perf_counter() - t0 >= MIN_ROUND_S:
+            break
+        n *= 2
+    best = float("inf")
+    for _ in range(ROUNDS):
+        t0 = time.perf_counter()
+        for _ in range(n):
+            fn()
+        best = min(best, (time.perf_counter() - t0) / n)
+    return best
+
+def peak_alloc(fn) -> int:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    fn()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return int(peak)
+
+def measure(names, passes=1):
+    """Best of `passes` per case; each case is timed against a calibration run taken right before it."""
+    calib_fn = _calibration()
+    calibs, out = [], {}
+    for name in names:
+        fn = CASES[name]()
+        best = None
+        for _ in range(passes):
+            calib = time_per_call(calib_fn)
+            t = time_per_call(fn)
+            calibs.append(calib)
+            if best is None or t / calib < best["rel_time"]:
+                best = {"time_s": t, "rel_time": t / calib, "calls_per_s": 1.0 / t}
+        best["peak_alloc_bytes"] = peak_alloc(fn)
+        out[name] = best
+    return float(np.median(calibs)), out
+
+def _fmt_bytes(b):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(b) < 1024:
+            return f"{b:.0f} {unit}" if unit == "B" else f"{b:.1f} {unit}"
+        b /= 1024
+    return f"{b:.1f} TiB"
+
+def compare(baseline: dict, current: dict, tolerance: float):
+    """Per-case report lines and the names of cases over tolerance."""
+    lines = [f"{'case':34} {'calls/s':>10} {'base/s':>10} {'time x':>7} {'alloc':>11} {'base':>11} {'alloc x':>7}  status"]
+    failed = []
+    for name, cur in current.items():
+        base = baseline.get(name)
+        if base is None:
+            lines.append(f"{name:34} {cur['calls_per_s']:10.1f} {'-':>10} {'-':>7} {_fmt_bytes(cur['peak_alloc_bytes']):>11} {'-':>11} {'-':>7}  new (no baseline)")
+            continue
+        t_ratio = cur["rel_time"] / base["rel_time"]
+        a_ratio = cur["peak_alloc_bytes"] / max(1, base["peak_alloc_bytes"])
+        problems = []
+        if t_ratio > 1 + tolerance:
+            problems.append("SLOWER")
+        if a_ratio > 1 + tolerance and cur["peak_alloc_bytes"] - base["peak_alloc_bytes"] > 64 * 1024:
+            problems.append("MORE ALLOC")
+        if problems:
+            failed.append(name)
+        status = " + ".join(problems) if problems else ("faster" if t_ratio < 1 / (1 + tolerance) else "ok")
+        base_rate = 1.0 / base["time_s"]
+        lines.append(f"{name:34} {cur['calls_per_s']:10.1f} {base_rate:10.1f} {t_ratio:7.2f} "
+                     f"{_fmt_bytes(cur['peak_alloc_bytes']):>11} {_fmt_bytes(base['peak_alloc_bytes']):>11} {a_ratio:7.2f}  {status}")
+    return lines, failed
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--update", action="store_true", help="record current results as the baselines")
+    ap.add_argument("--tolerance", type=float, default=TOLERANCE)
+    ap.add_argument("--only", nargs="*", help="case names (or prefixes) to run")
+    args = ap.parse_args(argv)
+
+    names = [n for n in CASES if not args.only or any(n.startswith(p) for p in args.only)]
+    calib, current = measure(names, passes=PASSES if args.update else 1)
+    if args.update:
+        data = json.loads(BASELINES.read_text()) if BASELINES.exists() else {"cases": {}}
+        data["cases"].update(current)
+        data["calibration_s"] = calib
+        data["machine"] = f"{platform.machine()} {platform.python_implementation()} {platform.python_version()}"
+        BASELINES.write_text(json.dumps(data, indent=2, sort_keys=True) + "\n")
+        print(f"Saved {len(current)} baselines -> {BASELINES}")
+        return 0
+
+    if not BASELINES.exists():
+        print(f"No baselines at {BASELINES}; run with --update first.")
+        return 1
+    data = json.loads(BASELINES.read_text())
+    lines, failed = compare(data["cases"], current, args.tolerance)
+    if failed:
+        # timing noise: re-measure only the failing cases before reporting
+        _, again = measure(failed, passes=PASSES)
+        for name, res in again.items():
+            if res["rel_time"] < current[name]["rel_time"]:
+                current[name] = res
+        lines, failed = compare(data["cases"], current, args.tolerance)
+    print(f"calibration: {calib*1e3:.2f} ms (baseline {data['calibration_s']*1e3:.2f} ms on {data.get('machine', '?')}); "
+          f"times are compared relative to it, tolerance {args.tolerance:.0%}")
+    print("\n".join(lines))
+    if failed:
+        print(f"\nREGRESSION in {len(failed)} case(s): {', '.join(failed)}")
+        return 1
+    print("\nno regressions")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
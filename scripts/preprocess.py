@@ -2,6 +2,8 @@ from pathlib import Path
 from recs.dataio import read_characters_xlsx, write_parquet
 from recs.features import normalize
 from recs.report import print_basic_report
+from recs.canon import build_field_canon, canonicalize_list, save_canon
+from recs.legal import RULES, rule_items
 
 RAW_XLSX = Path("data/raw/characters.xlsx")
 OUT_DIR  = Path("processed")
@@ -10,11 +12,20 @@ def main():
     df = read_characters_xlsx(RAW_XLSX)
     tables = normalize(df)
 
+    # fold spelling variants (long_sword / Longsword / longsword) into canonical ids; enchantment
+    # bonuses (longsword_1) and word order (sword_long) are kept, so those stay separate items
+    mech = tables["mechanical"]
+    mappings = {}
+    for field in ["feats", "weapons", "armor"]:
+        mappings[field] = build_field_canon(mech[field], extra=rule_items(RULES, field))
+        mech[field] = [canonicalize_list(lst, mappings[field]) for lst in mech[field]]
+
     OUT_DIR.mkdir(parents=True, exist_ok=True)
     write_parquet(tables["mechanical"], OUT_DIR / "mechanical.parquet")
     write_parquet(tables["classes_long"], OUT_DIR / "classes_long.parquet")
     write_parquet(tables["narrative"], OUT_DIR / "narrative.parquet")
     write_parquet(tables["original"], OUT_DIR / "original_snapshot.parquet")
+    save_canon(OUT_DIR / "canon_map.parquet", mappings)
 
     print("Saved to /processed")
     print_basic_report(tables["mechanical"], tables["classes_long"])
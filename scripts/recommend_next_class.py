@@ -4,7 +4,7 @@ from collections import Counter, defaultdict
 
 from recs.text import fit_tfidf, nearest_neighbors
 from recs.features import normalize  # for parsing if needed
-from recs.dataio import write_parquet
+from recs.dataio import write_parquet, read_parquet
 
 CLONG = Path("processed/classes_long.parquet")
 NARR  = Path("processed/narrative.parquet")
@@ -29,9 +29,9 @@ def class_cooc(bags: dict[int, set[str]]):
     return co
 
 def main():
-    mech = pd.read_parquet(MECH)
-    narr = pd.read_parquet(NARR)
-    cl   = pd.read_parquet(CLONG)
+    mech = read_parquet(MECH, columns=["row_id", "primary_class"])
+    narr = read_parquet(NARR, columns=["row_id", "narrative_text"])
+    cl   = read_parquet(CLONG, columns=["row_id", "class"])
 
     bags = build_class_bags(cl)
     co   = class_cooc(bags)
@@ -0,0 +1,38 @@
+import pandas as pd
+
+from recs.canon import build_field_canon, canonicalize_list, canon_key
+from recs.legal import RULES, compile_rules, row_penalties, rule_items
+
+
+def test_canon_key_keeps_bonus_and_word_order():
+    assert canon_key("long_sword") == canon_key("Longsword") == "longsword"
+    assert canon_key("longsword_1") == canon_key("+1_longsword") != canon_key("longsword")
+    assert canon_key("crossbow_light") != canon_key("light_crossbow")
+
+
+def test_enchanted_variant_is_its_own_item():
+    mapping = build_field_canon(pd.Series([["longsword"], ["longsword_1"], ["long_sword"], ["longsword"]]))
+    assert mapping["long_sword"] == "longsword"
+    assert mapping["longsword_1"] == "longsword_1"
+
+
+def test_heavy_armor_variant_still_penalized_after_canonicalization():
+    # the most frequent spelling becomes the canonical id, not the rule's "half_plate"
+    armor = pd.Series([["half_plate_armor"], ["half_plate_armor"], ["half_plate"], ["leather_armor"]])
+    mapping = build_field_canon(armor, extra=rule_items(RULES, "armor"))
+    assert mapping["half_plate"] == "half_plate_armor"
+    vocab = sorted({t for lst in armor for t in canonicalize_list(lst, mapping)})
+    engine = compile_rules("armor", ["fighter", "wizard"], vocab, canon=mapping)
+    assert row_penalties(engine, "wizard") == {"half_plate_armor": -0.25}
+    assert row_penalties(engine, "fighter") == {}
+
+
+def test_enchanted_martial_weapon_penalized():
+    engine = compile_rules("weapons", ["wizard"], ["dagger", "longsword_1", "plus_2_warhammer"])
+    assert set(row_penalties(engine, "wizard")) == {"longsword_1", "plus_2_warhammer"}
+
+
+def test_druid_scimitar_and_monk_shortsword_only():
+    engine = compile_rules("weapons", ["druid", "monk"], ["longsword", "rapier", "scimitar", "shortsword"])
+    assert set(row_penalties(engine, "druid")) == {"longsword", "rapier", "shortsword"}
+    assert set(row_penalties(engine, "monk")) == {"longsword", "rapier", "scimitar"}